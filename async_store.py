@@ -0,0 +1,236 @@
+# Asyncio interface to the contacts database, for services that serve many
+# lookups at once:
+#
+#     async with AsyncContactStore() as store:
+#         rows = await store.search_tables("alice", ["friends"])
+#         async for row in store.iter_entries("friends"):
+#             ...
+#
+# Reads run on a thread pool, each on a read-only connection borrowed from
+# a fixed pool. Writes are queued and carried out one at a time by a single
+# writer task on its own connection, so they never wait on each other's
+# locks. The store works on whatever backend.open_store last selected.
+#
+# Backend functions report problems with a message and a failure value;
+# here each call collects its own messages (stdout is left alone) and a
+# failure raises ContactStoreError with the backend's error message.
+import asyncio
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import backend as db_ops
+
+DEFAULT_READERS = 4
+DEFAULT_CHUNK_SIZE = 500
+
+
+class ContactStoreError(Exception):
+    pass
+
+
+# Run function(*args), returning its result and the error messages the
+# backend reported while it ran. Progress notes are dropped.
+def capture_errors(function, *args):
+    with db_ops.capture_messages() as messages:
+        result = function(*args)
+    return result, [message for message, error in messages if error]
+
+
+def next_chunk(rows, chunk_size):
+    return list(itertools.islice(rows, chunk_size))
+
+
+class AsyncContactStore:
+    def __init__(self, readers=DEFAULT_READERS, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.reader_count = readers
+        self.chunk_size = chunk_size
+        self.readers = None
+        self.writer = None
+        self.connections = None
+        self.reader_connections = []
+        self.write_conn = None
+        self.writes = None
+        self.writer_task = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    # Open the writer connection (bringing the schema up to date) and the
+    # pool of reader connections
+    async def open(self):
+        try:
+            self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="contacts-writer")
+            self.readers = ThreadPoolExecutor(max_workers=self.reader_count, thread_name_prefix="contacts-reader")
+            self.write_conn, _ = await self.call(self.writer, self.connect, False)
+            self.connections = asyncio.Queue()
+            for _ in range(self.reader_count):
+                conn, _ = await self.call(self.readers, self.connect, True)
+                self.reader_connections.append(conn)
+                self.connections.put_nowait(conn)
+        except BaseException:
+            await self.close()
+            raise
+        self.writes = asyncio.Queue()
+        self.writer_task = asyncio.create_task(self.run_writer())
+
+    # Finish the writes already queued, then close every connection
+    async def close(self):
+        if self.writer_task is not None:
+            await self.writes.put(None)
+            await self.writer_task
+            self.writer_task = None
+        for conn in self.reader_connections + [self.write_conn]:
+            if conn is not None:
+                conn.close()
+        self.reader_connections = []
+        self.write_conn = None
+        for executor in (self.readers, self.writer):
+            if executor is not None:
+                executor.shutdown(wait=False)
+        self.readers = self.writer = None
+
+    @staticmethod
+    def connect(read_only):
+        conn = db_ops.connect_to_database(read_only, check_same_thread=False)
+        if conn is None:
+            raise ContactStoreError("Could not open the database.")
+        if not db_ops.migrate_database(conn):
+            conn.close()
+            raise ContactStoreError("Could not update the database schema.")
+        return conn
+
+    # Run function(*args) on an executor, returning its result and the
+    # error messages it reported. A task cancelled while a query runs
+    # interrupts the query and waits for it to stop before letting go of conn.
+    async def call(self, executor, function, *args, conn=None):
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(executor, capture_errors, function, *args)
+        try:
+            result, errors = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if conn is not None:
+                conn.interrupt()
+            try:
+                await future
+            except Exception:
+                pass
+            raise
+        return result, errors
+
+    # Run function(conn, *args) with a pooled read-only connection. Any
+    # error the backend reports means the read failed.
+    async def read(self, function, *args):
+        conn = await self.connections.get()
+        try:
+            result, errors = await self.call(self.readers, function, conn, *args, conn=conn)
+        finally:
+            self.connections.put_nowait(conn)
+        if errors:
+            raise ContactStoreError(errors[-1])
+        return result
+
+    # Queue function(conn, *args) for the writer task and wait for its result
+    async def write(self, function, *args):
+        future = asyncio.get_running_loop().create_future()
+        await self.writes.put((function, args, future))
+        return await future
+
+    async def run_writer(self):
+        while True:
+            job = await self.writes.get()
+            if job is None:
+                return
+            function, args, future = job
+            if future.cancelled():
+                continue
+            try:
+                result = await self.call(self.writer, function, self.write_conn, *args)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+    # Stream the rows of iterate(conn, *args), a chunk at a time, while
+    # holding one pooled connection. A loop left early gives the connection
+    # back once the iterator is closed: use contextlib.aclosing, or wait for
+    # it to be garbage collected.
+    async def iterate(self, iterate, *args):
+        conn = await self.connections.get()
+        try:
+            rows = iterate(conn, *args)
+            try:
+                while True:
+                    chunk, errors = await self.call(
+                        self.readers, next_chunk, rows, self.chunk_size, conn=conn
+                    )
+                    if errors:
+                        raise ContactStoreError(errors[-1])
+                    if not chunk:
+                        return
+                    for row in chunk:
+                        yield row
+            finally:
+                rows.close()
+        finally:
+            self.connections.put_nowait(conn)
+
+    async def fetch_entries(self, table_name):
+        return await self.read(db_ops.fetch_entries, table_name)
+
+    def iter_entries(self, table_name):
+        return self.iterate(db_ops.iter_entries, table_name, self.chunk_size)
+
+    async def search_tables(self, search_term, table_names, search_type='name'):
+        return await self.read(db_ops.search_tables, search_term, table_names, search_type)
+
+    def iter_search_tables(self, search_term, table_names, search_type='name'):
+        return self.iterate(db_ops.iter_search_tables, search_term, table_names, search_type, self.chunk_size)
+
+    async def combine_tables(self, table_names, dedupe=False):
+        return await self.read(db_ops.combine_tables, table_names, dedupe)
+
+    def iter_combined_tables(self, table_names, dedupe=False):
+        return self.iterate(db_ops.iter_combined_tables, table_names, self.chunk_size, dedupe)
+
+    async def add_entry(self, table_name, entry_data):
+        succeeded, errors = await self.write(db_ops.add_entry, table_name, entry_data)
+        if not succeeded:
+            raise ContactStoreError(errors[-1] if errors else "Could not add the entry.")
+
+    async def edit_entry(self, table_name, entry_id, entry_data):
+        succeeded, errors = await self.write(db_ops.edit_entry, table_name, entry_id, entry_data)
+        if not succeeded:
+            raise ContactStoreError(errors[-1] if errors else "Could not update the entry.")
+
+    # Returns (imported, skipped). progress, if given, is called on the event
+    # loop with the backend's counts. Cancelling the calling task cancels the
+    # import the way returning False from a backend progress callback does.
+    async def import_google_contacts(self, table_name, file_path, mapping, progress=None, update=True):
+        loop = asyncio.get_running_loop()
+        cancelled = threading.Event()
+
+        def report(counts):
+            if progress is not None:
+                loop.call_soon_threadsafe(progress, counts)
+            return not cancelled.is_set()
+
+        def run_import(conn):
+            return db_ops.import_google_contacts(
+                conn, table_name, file_path, mapping, progress=report, update=update
+            )
+
+        try:
+            (imported, skipped, error), _ = await self.write(run_import)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        if error:
+            raise ContactStoreError(error)
+        return imported, skipped
@@ -1,50 +1,835 @@
 from pathlib import Path
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
+import base64
+import binascii
+import contextlib
 import csv
 import hashlib
+import heapq
+import json
 import mimetypes
+import re
+import shutil
 import sqlite3
 import sys
 import os
+import tempfile
+import threading
+import weakref
+import time
+import unicodedata
+import zlib
 from urllib.parse import urlparse
-from urllib.request import Request, urlopen
 
-if sys.platform == "win32":
-    base = Path.home() / "AppData" / "Local"
-else:
-    base = Path.home() / ".local" / "share"
+# Messages for whoever runs the backend: progress notes and errors. They
+# are printed, which is what the GUI console and the command line show.
+# Inside capture_messages() a thread's messages are collected instead, as
+# (message, is_error) pairs, without touching sys.stdout.
+message_capture = threading.local()
 
-app_dir = base / "connections-app"
-app_dir.mkdir(parents=True, exist_ok=True)
-photos_dir = app_dir / "photos"
-photos_dir.mkdir(parents=True, exist_ok=True)
+
+def report(message, error=False):
+    captured = getattr(message_capture, "messages", None)
+    if captured is None:
+        print(message)
+    else:
+        captured.append((message, error))
+
+
+def report_error(message):
+    report(message, error=True)
+
+
+@contextlib.contextmanager
+def capture_messages():
+    previous = getattr(message_capture, "messages", None)
+    message_capture.messages = captured = []
+    try:
+        yield captured
+    finally:
+        message_capture.messages = previous
+
+
+# Where the database, photos and thumbnails live. Nothing is touched on
+# import: directories are created the first time something is stored in
+# them. open_store switches to another location; CONNECTIONS_DATA_DIR and
+# CONNECTIONS_PHOTOS_DIR override the defaults.
+DATA_DIR_ENV = "CONNECTIONS_DATA_DIR"
+PHOTOS_DIR_ENV = "CONNECTIONS_PHOTOS_DIR"
+MEMORY_STORE = ":memory:"
+PHOTO_CACHE_SUBDIR = "cache"
+
+
+def default_data_dir():
+    if os.environ.get(DATA_DIR_ENV):
+        return Path(os.environ[DATA_DIR_ENV]).expanduser()
+    if sys.platform == "win32":
+        base = Path.home() / "AppData" / "Local"
+    else:
+        base = Path.home() / ".local" / "share"
+    return base / "connections-app"
+
+
+# One store location. data_dir may be MEMORY_STORE for a database that only
+# lives in memory, shared by every connection of this process through a
+# shared-cache URI; its photos go to a temporary directory unless
+# photos_dir is given.
+class Store:
+    count = 0
+
+    def __init__(self, data_dir=None, photos_dir=None):
+        self.memory = data_dir == MEMORY_STORE
+        self.data_dir = None if self.memory else Path(data_dir or default_data_dir()).expanduser()
+        photos_dir = photos_dir or os.environ.get(PHOTOS_DIR_ENV)
+        # A photos directory given by the user may hold other files, so the
+        # photo cache writes to (and only ever cleans up) a subdirectory of it
+        self.photos_dir = Path(photos_dir).expanduser() / PHOTO_CACHE_SUBDIR if photos_dir else None
+        self.thumbnails_dir = None
+        self.temporary = False
+        self.lock = threading.Lock()
+        # An in-memory database disappears with its last connection
+        self.keeper = None
+        Store.count += 1
+        self.name = f"connections-{os.getpid()}-{Store.count}"
+
+    def database(self):
+        if self.memory:
+            with self.lock:
+                if self.keeper is None:
+                    self.keeper = sqlite3.connect(self.uri(), uri=True, check_same_thread=False)
+            return self.uri()
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        return self.data_dir / "table.db"
+
+    def uri(self):
+        return f"file:{self.name}?mode=memory&cache=shared"
+
+    def base_dir(self):
+        if self.memory:
+            with self.lock:
+                if self.data_dir is None:
+                    self.data_dir = Path(tempfile.mkdtemp(prefix=f"{self.name}-"))
+                    self.temporary = True
+        return self.data_dir
+
+    def get_photos_dir(self):
+        if self.photos_dir is None:
+            self.photos_dir = self.base_dir() / "photos"
+        self.photos_dir.mkdir(parents=True, exist_ok=True)
+        return self.photos_dir
+
+    def get_thumbnails_dir(self):
+        if self.thumbnails_dir is None:
+            self.thumbnails_dir = self.base_dir() / "thumbnails"
+        self.thumbnails_dir.mkdir(parents=True, exist_ok=True)
+        return self.thumbnails_dir
+
+    def close(self):
+        if self.keeper is not None:
+            self.keeper.close()
+            self.keeper = None
+        if self.temporary:
+            shutil.rmtree(self.data_dir, ignore_errors=True)
+            self.temporary = False
+
+
+store = None
+store_lock = threading.Lock()
+
+
+def current_store():
+    global store
+    with store_lock:
+        if store is None:
+            store = Store()
+        return store
+
+
+def get_photos_dir():
+    return current_store().get_photos_dir()
+
+
+def get_thumbnails_dir():
+    return current_store().get_thumbnails_dir()
+
+
+# Remote photo downloads: per-request timeout, retries after network errors,
+# and the limits applied when a whole import's photos are fetched at once
+PHOTO_DOWNLOAD_TIMEOUT = 10
+PHOTO_DOWNLOAD_RETRIES = 2
+PHOTO_DOWNLOAD_WORKERS = 8
+PHOTO_DOWNLOADS_PER_HOST = 2
+PHOTO_DOWNLOAD_DEADLINE = 300
+
+# Photos no contact uses any more are kept as cache up to this total size
+PHOTO_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Cached photos are checked with the server again once they are this old
+PHOTO_REVALIDATE_AFTER = 7 * 24 * 60 * 60
+
+# Rows inserted per executemany during CSV imports
+IMPORT_CHUNK_SIZE = 1000
 
 # Define the database file path
 #db_file_path = os.path.join(os.path.dirname(__file__), 'table.db')
 
-# Connect to the SQLite database file
-def connect_to_database():
+# Settings applied to every connection. WAL lets readers keep working while
+# a writer commits; synchronous=NORMAL is durable enough in WAL mode and
+# avoids an fsync per transaction.
+SQLITE_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("cache_size", -16000),
+    ("mmap_size", 256 * 1024 * 1024),
+    ("temp_store", "MEMORY"),
+    ("busy_timeout", 5000),
+    ("foreign_keys", "ON"),
+)
+
+
+# Connections opened by this module remember that their schema is current
+# and which groups they have already seen (see ensure_table_schema)
+class StoreConnection(sqlite3.Connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.schema_current = False
+        self.known_tables = set()
+
+
+def configure_connection(conn, read_only=False):
+    for name, value in SQLITE_PRAGMAS:
+        if read_only and name == "journal_mode":
+            continue
+        conn.execute(f'PRAGMA {name} = {value}')
+    if read_only:
+        conn.execute('PRAGMA query_only = ON')
+
+
+# Connect to the SQLite database file. Read-only connections refuse writes,
+# which makes them safe to hand to searches running next to the writer.
+def connect_to_database(read_only=False, check_same_thread=True):
+    active = current_store()
     try:
-        conn = sqlite3.connect(app_dir / "table.db")
-        print('Connected to the SQLite database.')
+        conn = sqlite3.connect(
+            active.database(),
+            check_same_thread=check_same_thread,
+            factory=StoreConnection,
+            uri=active.memory,
+        )
+        configure_connection(conn, read_only)
+        if active.memory:
+            # Shared-cache connections lock tables against each other;
+            # let readers see uncommitted rows instead of waiting
+            conn.execute('PRAGMA read_uncommitted = ON')
+        report('Connected to the SQLite database.')
         return conn
     except sqlite3.Error as e:
-        print(f'Error opening database: {e}')
+        report_error(f'Error opening database: {e}')
+        return None
+
+
+# Per-thread connections of ConnectionPool.get, closed when their thread exits
+class ThreadConnections:
+    def __init__(self, generation):
+        self.generation = generation
+        self.connections = {}
+        weakref.finalize(self, close_connections, self.connections)
+
+
+def close_connections(connections):
+    for conn in connections.values():
+        conn.close()
+    connections.clear()
+
+
+# Hands out connections without ever closing one another thread is using.
+# get() gives every thread its own connections, one read-write and one
+# read-only, opened on first use and closed when the thread exits. Threads
+# whose Python state does not outlive a single call (QThreadPool threads)
+# check connections out with acquire() and give them back with release()
+# instead; idle ones are reused. After close_all() (a store switch), each
+# connection of the previous store is closed by its own thread, or when it is
+# released.
+class ConnectionPool:
+    MAX_IDLE = 8
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.idle = {False: [], True: []}
+        self.generation = 0
+
+    def get(self, read_only=False):
+        owned = getattr(self.local, "owned", None)
+        if owned is None or owned.generation != self.generation:
+            if owned is not None:
+                close_connections(owned.connections)
+            owned = self.local.owned = ThreadConnections(self.generation)
+        conn = owned.connections.get(read_only)
+        if conn is None:
+            conn = connect_to_database(read_only, check_same_thread=False)
+            if conn is not None:
+                owned.connections[read_only] = conn
+        return conn
+
+    def acquire(self, read_only=False):
+        with self.lock:
+            idle = self.idle[read_only]
+            conn = idle.pop() if idle else None
+            generation = self.generation
+        if conn is None:
+            conn = connect_to_database(read_only, check_same_thread=False)
+            if conn is not None:
+                conn.pool_key = (generation, read_only)
+        return conn
+
+    # Rolls back whatever the borrower left open; a connection that cannot
+    # be rolled back is closed and the error raised
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            raise
+        generation, read_only = conn.pool_key
+        with self.lock:
+            idle = self.idle[read_only]
+            keep = generation == self.generation and len(idle) < self.MAX_IDLE
+            if keep:
+                idle.append(conn)
+        if not keep:
+            conn.close()
+
+    def close_all(self):
+        with self.lock:
+            self.generation += 1
+            closing = self.idle[False] + self.idle[True]
+            self.idle = {False: [], True: []}
+        for conn in closing:
+            conn.close()
+        owned = getattr(self.local, "owned", None)
+        if owned is not None:
+            close_connections(owned.connections)
+
+
+connection_pool = ConnectionPool()
+
+
+def get_connection():
+    return connection_pool.get()
+
+
+def get_read_connection():
+    return connection_pool.get(read_only=True)
+
+
+def acquire_connection(read_only=False):
+    return connection_pool.acquire(read_only)
+
+
+def release_connection(conn):
+    connection_pool.release(conn)
+
+
+# Use the store at path (a data directory, or MEMORY_STORE) from now on,
+# with photos in photos_dir if given. Connections to the previous store are
+# closed. Returns a read-write connection with the schema brought up to
+# date, or None if the database could not be opened.
+def open_store(path=None, photos_dir=None):
+    global store
+    with store_lock:
+        previous, store = store, Store(path, photos_dir)
+    connection_pool.close_all()
+    if previous is not None:
+        previous.close()
+    invalidate_table_stats()
+
+    conn = get_connection()
+    if conn is None or not migrate_database(conn):
+        return None
+    return conn
+
+# Columns a caller supplies for a contact, in the order entry_data tuples use
+CONTACT_FIELDS = (
+    "name",
+    "phone_contact",
+    "email",
+    "whatsapp_phone",
+    "signal_phone",
+    "telegram_handle",
+    "facebook",
+    "linkedin",
+    "photo",
+    "relationship",
+    "other_notes",
+)
+
+# Columns returned for every entry; keeps the row layout of the old per-group tables
+ENTRY_COLUMNS = ("id",) + CONTACT_FIELDS + ("created_at", "last_modified")
+ENTRY_SELECT = ", ".join(f"c.{column}" for column in ENTRY_COLUMNS)
+
+# Contact columns covered by the full-text index (everything except the photo path)
+SEARCH_FIELDS = tuple(field for field in CONTACT_FIELDS if field != "photo")
+# bm25 column weights: a hit in the name outranks a hit in the notes
+SEARCH_WEIGHTS = ", ".join("10.0" if field == "name" else "1.0" for field in SEARCH_FIELDS)
+
+LEGACY_CONTACTS_TABLE = "legacy contacts"
+
+# Imported contacts hold their photo URL until it has been downloaded
+PENDING_PHOTO = "photo LIKE 'http%'"
+
+# Normalized shadow columns for reverse lookup, kept in step with the
+# fields they are derived from by every write path (see lookup_values)
+LOOKUP_FIELDS = {
+    "phone_norm": "phone_contact",
+    "whatsapp_norm": "whatsapp_phone",
+    "signal_norm": "signal_phone",
+    "email_norm": "email",
+}
+PHONE_LOOKUP_FIELDS = ("phone_norm", "whatsapp_norm", "signal_norm")
+
+# Numbers written with and without their country or trunk prefix ("+1 555
+# 123 4567", "555 123 4567", "020 ..." and "+44 20 ...") agree on their last
+# digits; lookups fall back to comparing these
+PHONE_TAIL_DIGITS = 9
+PHONE_TAIL_MIN_DIGITS = 7
+
+
+def phone_tail_sql(column):
+    return f"substr(ltrim({column}, '+'), -{PHONE_TAIL_DIGITS})"
+
+# Parameters: table name, the CONTACT_FIELDS values, then lookup_values()
+INSERT_CONTACT_SQL = f'''
+INSERT INTO contacts (group_id, {", ".join(CONTACT_FIELDS + tuple(LOOKUP_FIELDS))})
+VALUES ((SELECT id FROM tables WHERE name = ?), {", ".join("?" for _ in CONTACT_FIELDS + tuple(LOOKUP_FIELDS))})
+'''
+
+IMPORTED_FIELDS = CONTACT_FIELDS + tuple(LOOKUP_FIELDS) + ("import_key", "import_hash")
+
+# Parameters: table name, then values for IMPORTED_FIELDS. Without update
+# every record is a new contact, so its key is dropped.
+INSERT_IMPORTED_SQL = f'''
+INSERT INTO contacts (group_id, {", ".join(IMPORTED_FIELDS[:-2])}, import_hash)
+VALUES ((SELECT id FROM tables WHERE name = ?), {", ".join("?" for _ in IMPORTED_FIELDS[:-1])})
+'''
+
+# Inserts a record, or updates the contact imported under the same key if
+# the record's hash changed
+UPSERT_CONTACT_SQL = f'''
+INSERT INTO contacts (group_id, {", ".join(IMPORTED_FIELDS)})
+VALUES ((SELECT id FROM tables WHERE name = ?), {", ".join("?" for _ in IMPORTED_FIELDS)})
+ON CONFLICT (group_id, import_key) DO UPDATE SET
+    {", ".join(f"{field} = excluded.{field}" for field in IMPORTED_FIELDS if field != "import_key")},
+    last_modified = CURRENT_TIMESTAMP
+WHERE contacts.import_hash IS NOT excluded.import_hash
+'''
+
+
+# Phone numbers reduced to their digits, E.164 style: "+" and the digits
+# for international numbers (written with + or 00), bare digits otherwise
+def normalize_phone(phone):
+    phone = (phone or "").strip()
+    digits = re.sub(r"\D", "", phone)
+    if not digits:
         return None
+    if phone.startswith("+"):
+        return f"+{digits}"
+    if digits.startswith("00") and len(digits) > 2:
+        return f"+{digits[2:]}"
+    return digits
+
+
+def normalize_email(email):
+    return (email or "").strip().casefold() or None
 
-# Create a table to store metadata about other tables if it doesn't exist
+
+# Values of the LOOKUP_FIELDS columns for entry_data laid out as CONTACT_FIELDS
+def lookup_values(entry_data):
+    values = dict(zip(CONTACT_FIELDS, entry_data))
+    return tuple(
+        normalize_email(values[source]) if column == "email_norm" else normalize_phone(values[source])
+        for column, source in LOOKUP_FIELDS.items()
+    )
+
+
+# Create a table to store metadata about other tables if it doesn't exist,
+# along with the shared contacts table every group stores its entries in.
+# Brings the whole schema up to date; call once at startup.
 def create_tables_metadata_table(conn):
+    if migrate_database(conn):
+        report('Tables metadata table created or already exists.')
+
+
+# Schema migrations in the order they were introduced. PRAGMA user_version
+# records how many have been applied; each runs inside the single
+# transaction opened by migrate_database and must not commit on its own.
+def create_base_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tables (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # A group named "contacts" used to own a table of that name
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(contacts)')}
+    if columns and "group_id" not in columns:
+        conn.execute(f'ALTER TABLE contacts RENAME TO "{LEGACY_CONTACTS_TABLE}"')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS contacts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            group_id INTEGER NOT NULL REFERENCES tables(id) ON DELETE CASCADE,
+            name TEXT NOT NULL,
+            phone_contact TEXT,
+            email TEXT,
+            whatsapp_phone TEXT,
+            signal_phone TEXT,
+            telegram_handle TEXT,
+            facebook TEXT,
+            linkedin TEXT,
+            photo TEXT,
+            relationship TEXT,
+            other_notes TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            last_modified DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS contacts_group_idx ON contacts (group_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS contacts_group_name_idx ON contacts (group_id, name)')
+    conn.execute(f'CREATE INDEX IF NOT EXISTS contacts_pending_photo_idx ON contacts (photo) WHERE {PENDING_PHOTO}')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS photo_cache (
+            url TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            last_used REAL NOT NULL,
+            checked_at REAL NOT NULL
+        )
+    ''')
+
+
+# Full-text index over the contacts table. It stores no copy of the data
+# (content='contacts') and is kept in sync by triggers, so every write path
+# that touches contacts keeps it current without extra code.
+def create_search_index(conn):
+    if search_index_exists(conn):
+        return
+    columns = ", ".join(SEARCH_FIELDS)
+    new_values = ", ".join(f"new.{field}" for field in SEARCH_FIELDS)
+    old_values = ", ".join(f"old.{field}" for field in SEARCH_FIELDS)
+    try:
+        conn.execute(f'''
+            CREATE VIRTUAL TABLE contacts_fts USING fts5(
+                {columns}, content='contacts', content_rowid='id'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        # SQLite builds without FTS5 fall back to LIKE scans in search_tables
+        report(f'Full-text search index not available: {e}')
+        return
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS contacts_fts_insert AFTER INSERT ON contacts BEGIN
+            INSERT INTO contacts_fts (rowid, {columns}) VALUES (new.id, {new_values});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS contacts_fts_delete AFTER DELETE ON contacts BEGIN
+            INSERT INTO contacts_fts (contacts_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS contacts_fts_update AFTER UPDATE OF {columns} ON contacts BEGIN
+            INSERT INTO contacts_fts (contacts_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO contacts_fts (rowid, {columns}) VALUES (new.id, {new_values});
+        END
+    ''')
+    conn.execute("INSERT INTO contacts_fts (contacts_fts) VALUES ('rebuild')")
+    report('Full-text search index created.')
+
+
+# Move contacts out of the old one-table-per-group layout into the contacts
+# table, dropping each legacy table once its rows have been copied
+def migrate_legacy_tables(conn):
+    names = [row[0] for row in conn.execute('SELECT name FROM tables ORDER BY id')]
+    legacy = [
+        name for name in names
+        if is_valid_table_name(name) and legacy_table_exists(conn, name)
+    ]
+
+    copied = CONTACT_FIELDS + ("created_at", "last_modified")
+    for table_name in legacy:
+        source = legacy_table_name(table_name)
+        columns = {row[1] for row in conn.execute(f'PRAGMA table_info("{source}")')}
+        select_list = ", ".join(
+            column if column in columns else "NULL" for column in copied
+        )
+        conn.execute(
+            f'''
+            INSERT INTO contacts (group_id, {", ".join(copied)})
+            SELECT (SELECT id FROM tables WHERE name = ?), {select_list}
+            FROM "{source}" ORDER BY id
+            ''',
+            (table_name,),
+        )
+        conn.execute(f'DROP TABLE "{source}"')
+    if legacy:
+        report(f'Migrated {len(legacy)} tables into the contacts table.')
+
+
+# Per-group index in the order combined results are merged in
+def create_sort_index(conn):
+    conn.execute('CREATE INDEX IF NOT EXISTS contacts_group_sort_idx ON contacts (group_id, name COLLATE NOCASE)')
+
+
+# Blocking keys for duplicate detection, as duplicate_keys(row) computes them.
+# New contacts start unindexed, and editing a name, phone or email drops the
+# contact's keys until they are computed again.
+def create_duplicate_index(conn):
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(contacts)')}
+    if "dedupe_indexed" not in columns:
+        conn.execute('ALTER TABLE contacts ADD COLUMN dedupe_indexed INTEGER NOT NULL DEFAULT 0')
+    conn.execute('CREATE INDEX IF NOT EXISTS contacts_dedupe_pending_idx ON contacts (id) WHERE dedupe_indexed = 0')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS duplicate_keys (
+            key TEXT NOT NULL,
+            contact_id INTEGER NOT NULL,
+            PRIMARY KEY (key, contact_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS duplicate_keys_contact_idx ON duplicate_keys (contact_id)')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS contacts_dedupe_delete AFTER DELETE ON contacts BEGIN
+            DELETE FROM duplicate_keys WHERE contact_id = old.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS contacts_dedupe_update
+        AFTER UPDATE OF name, phone_contact, email, whatsapp_phone, signal_phone ON contacts BEGIN
+            DELETE FROM duplicate_keys WHERE contact_id = old.id;
+            UPDATE contacts SET dedupe_indexed = 0 WHERE id = new.id;
+        END
+    ''')
+
+
+# Normalized phone and email columns for lookup_by_phone and lookup_by_email,
+# filled in for existing contacts
+def create_lookup_columns(conn):
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(contacts)')}
+    for column in LOOKUP_FIELDS:
+        if column not in columns:
+            conn.execute(f'ALTER TABLE contacts ADD COLUMN {column} TEXT')
+    select_sql = f'SELECT id, {", ".join(CONTACT_FIELDS)} FROM contacts WHERE id > ? ORDER BY id LIMIT 1000'
+    update_sql = f'UPDATE contacts SET {", ".join(f"{column} = ?" for column in LOOKUP_FIELDS)} WHERE id = ?'
+    after = 0
+    while True:
+        rows = conn.execute(select_sql, (after,)).fetchall()
+        if not rows:
+            break
+        after = rows[-1][0]
+        conn.executemany(update_sql, ((*lookup_values(row[1:]), row[0]) for row in rows))
+    for column in LOOKUP_FIELDS:
+        conn.execute(f'CREATE INDEX IF NOT EXISTS contacts_{column}_idx ON contacts ({column})')
+
+
+# Import keys and hashes for re-importing updated exports. Only imports set
+# them: contacts already in a table may have been entered by hand, and an
+# import must never overwrite those.
+def create_import_keys(conn):
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(contacts)')}
+    for column in ("import_key", "import_hash"):
+        if column not in columns:
+            conn.execute(f'ALTER TABLE contacts ADD COLUMN {column} TEXT')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS contacts_import_key_idx ON contacts (group_id, import_key)')
+
+
+# Name words as the fuzzy name index stores them: split at spaces, ASCII
+# lowercased like SQLite's lower() and stripped of surrounding punctuation.
+# Triggers keep name_terms (each word and how many contacts use it) and
+# name_term_grams (the padded trigrams of each word) in step with contact
+# names, so the index needs no work outside the writes themselves.
+NAME_TERM_PUNCTUATION = ",.;:!?()[]\"'"
+NAME_TERM_MAX_GRAMS = 64
+
+
+NAME_TERM_SQL = "trim(value, '{}')".format(NAME_TERM_PUNCTUATION.replace("'", "''"))
+
+
+# The words of a name column as json_each rows: the quoted JSON string of
+# the name becomes an array once every space is replaced by '","'
+def name_words_sql(column):
+    return f"""json_each('[' || replace(json_quote(lower({column})), ' ', '","') || ']')"""
+
+
+def name_terms_sql(column):
+    return f"SELECT DISTINCT {NAME_TERM_SQL} AS term FROM {name_words_sql(column)} WHERE term != ''"
+
+
+def name_term_grams_sql(column):
+    return f'''
+    SELECT DISTINCT substr('  ' || {column} || ' ', value + 1, 3) AS gram
+    FROM json_each('{json.dumps(list(range(NAME_TERM_MAX_GRAMS)))}')
+    WHERE value <= length({column})
+    '''
+
+
+def create_name_terms(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS name_terms (
+            id INTEGER PRIMARY KEY,
+            term TEXT NOT NULL UNIQUE,
+            contacts INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS name_term_grams (
+            gram TEXT NOT NULL,
+            term_id INTEGER NOT NULL,
+            PRIMARY KEY (gram, term_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS name_terms_insert AFTER INSERT ON name_terms BEGIN
+            INSERT INTO name_term_grams (gram, term_id) SELECT gram, new.id FROM ({name_term_grams_sql("new.term")});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS name_terms_delete AFTER DELETE ON name_terms BEGIN
+            DELETE FROM name_term_grams WHERE term_id = old.id AND gram IN ({name_term_grams_sql("old.term")});
+        END
+    ''')
+    add_terms = f'''
+            INSERT INTO name_terms (term, contacts) SELECT term, 1 FROM ({name_terms_sql("new.name")}) WHERE true
+            ON CONFLICT (term) DO UPDATE SET contacts = contacts + 1;
+    '''
+    drop_terms = f'''
+            UPDATE name_terms SET contacts = contacts - 1 WHERE term IN ({name_terms_sql("old.name")});
+            DELETE FROM name_terms WHERE contacts <= 0 AND term IN ({name_terms_sql("old.name")});
+    '''
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS contacts_name_terms_insert AFTER INSERT ON contacts BEGIN
+            {add_terms}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS contacts_name_terms_delete AFTER DELETE ON contacts BEGIN
+            {drop_terms}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS contacts_name_terms_update
+        AFTER UPDATE OF name ON contacts WHEN old.name IS NOT new.name BEGIN
+            {drop_terms}
+            {add_terms}
+        END
+    ''')
+    if conn.execute('SELECT 1 FROM name_terms LIMIT 1').fetchone() is None:
+        conn.execute(f'''
+            INSERT INTO name_terms (term, contacts)
+            SELECT term, COUNT(*) FROM (
+                SELECT DISTINCT c.id, {NAME_TERM_SQL} AS term FROM contacts c, {name_words_sql("c.name")}
+                WHERE term != ''
+            )
+            GROUP BY term
+        ''')
+
+
+# Indexes on the last digits of phone numbers, for lookup_by_phone
+def create_phone_tail_indexes(conn):
+    for column in PHONE_LOOKUP_FIELDS:
+        conn.execute(f'CREATE INDEX IF NOT EXISTS contacts_{column}_tail_idx ON contacts ({phone_tail_sql(column)})')
+
+
+MIGRATIONS = [
+    create_base_schema,
+    create_search_index,
+    migrate_legacy_tables,
+    create_sort_index,
+    create_duplicate_index,
+    create_lookup_columns,
+    create_import_keys,
+    create_name_terms,
+    create_phone_tail_indexes,
+]
+
+
+# Apply every migration the database has not seen yet, all in one
+# transaction. Connections from connect_to_database remember that their
+# schema is current, so later calls cost nothing.
+def migrate_database(conn):
+    if getattr(conn, "schema_current", False):
+        return True
+    try:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version < len(MIGRATIONS):
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Another process may have migrated while we waited for the lock
+                version = conn.execute('PRAGMA user_version').fetchone()[0]
+                for migration in MIGRATIONS[version:]:
+                    migration(conn)
+                conn.execute(f'PRAGMA user_version = {max(version, len(MIGRATIONS))}')
+                conn.commit()
+                invalidate_table_stats()
+            except BaseException:
+                conn.rollback()
+                raise
+            report(f'Database schema migrated from version {version} to {len(MIGRATIONS)}.')
+        elif version > len(MIGRATIONS):
+            report_error(f'Database schema version {version} is newer than this application supports.')
+    except sqlite3.Error as e:
+        report_error(f'Error migrating database schema: {e}')
+        return False
+
+    if isinstance(conn, StoreConnection):
+        conn.schema_current = True
+    return True
+
+
+def search_index_exists(conn):
+    try:
+        cursor = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'contacts_fts'")
+        return cursor.fetchone() is not None
+    except sqlite3.Error:
+        return False
+
+
+# Rebuild the full-text index from the contacts table, e.g. after the
+# database was edited by another tool with the triggers missing
+def rebuild_search_index(conn):
     try:
         with conn:
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS tables (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL UNIQUE,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            print('Tables metadata table created or already exists.')
+            if search_index_exists(conn):
+                conn.execute("INSERT INTO contacts_fts (contacts_fts) VALUES ('rebuild')")
+            else:
+                conn.execute('BEGIN IMMEDIATE')
+                create_search_index(conn)
+        report('Full-text search index rebuilt.')
+        return search_index_exists(conn)
     except sqlite3.Error as e:
-        print(f'Error creating tables metadata table: {e}')
+        report_error(f'Error rebuilding full-text search index: {e}')
+        return False
+
+
+# Name of the table that held a group's contacts before the shared contacts table
+def legacy_table_name(table_name):
+    if table_name.lower() == "contacts":
+        return LEGACY_CONTACTS_TABLE
+    return table_name
+
+
+def legacy_table_exists(conn, table_name):
+    if table_name.lower() == "tables":
+        return False
+    cursor = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ? COLLATE NOCASE",
+        (legacy_table_name(table_name),),
+    )
+    return cursor.fetchone() is not None
+
 
 # Validate table names
 def is_valid_table_name(name):
@@ -62,48 +847,33 @@ def is_valid_table_name(name):
 # Add a new table metadata entry
 def add_table_metadata(conn, table_name):
     if not is_valid_table_name(table_name):
-        print('Invalid table name.')
+        report_error('Invalid table name.')
         return False
     try:
         with conn:
             conn.execute('INSERT INTO tables (name) VALUES (?)', (table_name,))
-            print(f'Table metadata for "{table_name}" added.')
-            return True
+        report(f'Table metadata for "{table_name}" added.')
+        invalidate_table_stats(table_name)
+        return True
     except sqlite3.Error as e:
-        print(f'Error adding table metadata: {e}')
+        report_error(f'Error adding table metadata: {e}')
         return False
 
-# Create a new table
+# Create a new table. Groups share the contacts table, so this only has to
+# make sure the group has a metadata row.
 def create_table(conn, table_name):
     if not is_valid_table_name(table_name):
-        print('Invalid table name.')
+        report_error('Invalid table name.')
         return False
 
-    create_table_sql = f'''
-    CREATE TABLE IF NOT EXISTS {table_name} (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        phone_contact TEXT,
-        email TEXT,
-        whatsapp_phone TEXT,
-        signal_phone TEXT,
-        telegram_handle TEXT,
-        facebook TEXT,  -- New column
-        linkedin TEXT,  -- New column
-        photo TEXT,
-        relationship TEXT,
-        other_notes TEXT,
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        last_modified DATETIME DEFAULT CURRENT_TIMESTAMP
-    )
-    '''
     try:
         with conn:
-            conn.execute(create_table_sql)
-        print(f'Table "{table_name}" created.')
+            conn.execute('INSERT OR IGNORE INTO tables (name) VALUES (?)', (table_name,))
+        invalidate_table_stats(table_name)
+        report(f'Table "{table_name}" created.')
         return True
     except sqlite3.Error as e:
-        print(f'Error creating table: {e}')
+        report_error(f'Error creating table: {e}')
         return False
 
 
@@ -114,59 +884,53 @@ def fetch_all_tables(conn):
         tables = cursor.fetchall()
         return tables
     except sqlite3.Error as e:
-        print(f'Error fetching tables: {e}')
+        report_error(f'Error fetching tables: {e}')
         return []
 
 # Add an entry to a specific table
 def add_entry(conn, table_name, entry_data):
     if not is_valid_table_name(table_name):
-        print('Invalid table name.')
+        report_error('Invalid table name.')
         return False
     if not ensure_table_schema(conn, table_name):
         return False
 
-    entry_data = normalize_entry_photo(entry_data)
+    entry_data = normalize_entry_photo(entry_data, conn)
 
-    insert_sql = f'''
-    INSERT INTO {table_name} (name, phone_contact, email, whatsapp_phone, signal_phone, telegram_handle, facebook, linkedin, photo, relationship, other_notes)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    '''
     try:
         with conn:
-            conn.execute(insert_sql, entry_data)
-        print(f'Entry added to table "{table_name}".')
+            conn.execute(INSERT_CONTACT_SQL, (table_name, *entry_data, *lookup_values(entry_data)))
+        invalidate_table_stats(table_name)
+        report(f'Entry added to table "{table_name}".')
         return True
     except sqlite3.Error as e:
-        print(f'Error inserting entry: {e}')
+        report_error(f'Error inserting entry: {e}')
         return False
 
 
+# Check that a table exists before reading or writing it. The schema itself
+# is brought up to date once per connection by migrate_database, and groups
+# a connection has already seen are remembered, so repeated calls on hot
+# paths do no queries at all.
 def ensure_table_schema(conn, table_name):
+    if table_name in getattr(conn, "known_tables", ()):
+        return True
     if not is_valid_table_name(table_name):
-        print('Invalid table name.')
+        report_error('Invalid table name.')
         return False
-    try:
-        cursor = conn.execute(f'PRAGMA table_info({table_name})')
-        columns = {row[1] for row in cursor.fetchall()}
-    except sqlite3.Error as e:
-        print(f'Error reading table schema: {e}')
+    if not migrate_database(conn):
         return False
-
-    missing = []
-    if "photo" not in columns:
-        missing.append("photo")
-
-    if not missing:
-        return True
-
     try:
-        with conn:
-            for column in missing:
-                conn.execute(f'ALTER TABLE {table_name} ADD COLUMN {column} TEXT')
-        return True
+        cursor = conn.execute('SELECT 1 FROM tables WHERE name = ?', (table_name,))
+        if cursor.fetchone() is None:
+            report_error(f'Table "{table_name}" does not exist.')
+            return False
     except sqlite3.Error as e:
-        print(f'Error updating table schema: {e}')
+        report_error(f'Error reading table schema: {e}')
         return False
+    if isinstance(conn, StoreConnection):
+        conn.known_tables.add(table_name)
+    return True
 
 
 def is_remote_url(value):
@@ -188,67 +952,383 @@ def guess_photo_extension(url, content_type):
     return ".jpg"
 
 
-def fetch_remote_photo(url):
-    try:
-        request = Request(url, headers={"User-Agent": "Connections/1.0"})
-        with urlopen(request, timeout=10) as response:
-            content = response.read()
-            content_type = response.headers.get("Content-Type", "")
-    except Exception as e:
-        print(f'Error fetching photo from "{url}": {e}')
-        return ""
-
-    extension = guess_photo_extension(url, content_type)
-    name = hashlib.sha256(url.encode("utf-8")).hexdigest()[:16]
-    file_path = photos_dir / f"{name}{extension}"
-
+# Result of one remote photo request. path is "" when the download failed
+# and None when the server confirmed the cached copy is still current (304).
+RemotePhoto = namedtuple("RemotePhoto", "path etag last_modified")
+
+
+def fetch_remote_photo(
+    url,
+    timeout=PHOTO_DOWNLOAD_TIMEOUT,
+    retries=0,
+    deadline=None,
+    etag=None,
+    last_modified=None,
+):
+    # Imported here: urllib.request is slow to import and only needed for
+    # downloads, and the command-line interface should start quickly
+    from urllib.error import HTTPError
+    from urllib.request import Request, urlopen
+
+    headers = {"User-Agent": "Connections/1.0"}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    content = None
+    for attempt in range(retries + 1):
+        request_timeout = timeout
+        if deadline is not None:
+            request_timeout = min(timeout, deadline - time.monotonic())
+            if request_timeout <= 0:
+                report_error(f'Gave up fetching photo from "{url}": deadline reached')
+                return RemotePhoto("", None, None)
+        try:
+            request = Request(url, headers=headers)
+            with urlopen(request, timeout=request_timeout) as response:
+                content = response.read()
+                content_type = response.headers.get("Content-Type", "")
+                response_etag = response.headers.get("ETag")
+                response_last_modified = response.headers.get("Last-Modified")
+            break
+        except HTTPError as e:
+            if e.code == 304:
+                return RemotePhoto(None, e.headers.get("ETag") or etag, e.headers.get("Last-Modified") or last_modified)
+            # The server answered; asking again will not change a 4xx
+            if e.code < 500 or attempt == retries:
+                report_error(f'Error fetching photo from "{url}": {e}')
+                return RemotePhoto("", None, None)
+        except Exception as e:
+            if attempt == retries:
+                report_error(f'Error fetching photo from "{url}": {e}')
+                return RemotePhoto("", None, None)
+        time.sleep(min(0.5 * 2 ** attempt, 5))
+
+    if content is None:
+        return RemotePhoto("", None, None)
+
+    path = store_photo_bytes(content, guess_photo_extension(url, content_type))
+    return RemotePhoto(path, response_etag, response_last_modified)
+
+
+# Photos are stored under the hash of their bytes, so the same image
+# downloaded from several URLs (or imported twice) occupies one file
+def store_photo_bytes(content, extension=".jpg"):
+    name = hashlib.sha256(content).hexdigest()[:32]
+    file_path = get_photos_dir() / f"{name}{extension}"
+    if file_path.is_file():
+        return str(file_path)
+
+    temp_path = file_path.with_name(f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
     try:
-        with open(file_path, "wb") as file_handle:
+        with open(temp_path, "wb") as file_handle:
             file_handle.write(content)
+        os.replace(temp_path, file_path)
     except OSError as e:
-        print(f'Error saving photo "{file_path}": {e}')
+        report_error(f'Error saving photo "{file_path}": {e}')
+        try:
+            temp_path.unlink()
+        except OSError:
+            pass
         return ""
 
     return str(file_path)
 
 
-def normalize_photo_value(value):
+# Download many photos at once on a bounded thread pool. Identical URLs are
+# fetched once, no host gets more than per_host requests in flight, and the
+# whole batch stops at the deadline. validators maps a URL to the (etag,
+# last_modified) of a cached copy to revalidate. Yields (url, RemotePhoto)
+# in completion order; downloads that ran out of time fail with path "".
+def download_photos(
+    urls,
+    validators=None,
+    max_workers=PHOTO_DOWNLOAD_WORKERS,
+    per_host=PHOTO_DOWNLOADS_PER_HOST,
+    timeout=PHOTO_DOWNLOAD_TIMEOUT,
+    retries=PHOTO_DOWNLOAD_RETRIES,
+    deadline=PHOTO_DOWNLOAD_DEADLINE,
+):
+    queues = {}
+    for url in dict.fromkeys(urls):
+        if is_remote_url(url):
+            queues.setdefault(urlparse(url).netloc.lower(), deque()).append(url)
+    if not queues:
+        return
+
+    validators = validators or {}
+    end = time.monotonic() + deadline
+    in_flight = {host: 0 for host in queues}
+    futures = {}
+    pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="photo-download")
+
+    def schedule():
+        for host, queue in queues.items():
+            while queue and in_flight[host] < per_host:
+                url = queue.popleft()
+                etag, last_modified = validators.get(url, (None, None))
+                future = pool.submit(fetch_remote_photo, url, timeout, retries, end, etag, last_modified)
+                futures[future] = (host, url)
+                in_flight[host] += 1
+
+    try:
+        schedule()
+        while futures:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = wait(futures, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                host, url = futures.pop(future)
+                in_flight[host] -= 1
+                yield url, future.result()
+            schedule()
+
+        # Deadline reached: report whatever never finished as failed
+        for host, url in futures.values():
+            yield url, RemotePhoto("", None, None)
+        for queue in queues.values():
+            for url in queue:
+                yield url, RemotePhoto("", None, None)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Photo cache: the photo_cache table maps every downloaded URL to its local
+# file and the validators needed to ask the server whether it changed since
+photo_cache_stats = {"hits": 0, "misses": 0, "revalidated": 0}
+
+
+# Cached copies of the given URLs whose file is still on disk,
+# as {url: (path, etag, last_modified, checked_at)}
+def lookup_cached_photos(conn, urls):
+    found = {}
+    urls = list(urls)
+    for start in range(0, len(urls), 500):
+        chunk = urls[start:start + 500]
+        placeholders = ", ".join("?" for _ in chunk)
+        cursor = conn.execute(
+            f'SELECT url, path, etag, last_modified, checked_at FROM photo_cache WHERE url IN ({placeholders})',
+            chunk,
+        )
+        for url, path, etag, last_modified, checked_at in cursor:
+            if os.path.isfile(path):
+                found[url] = (path, etag, last_modified, checked_at)
+    return found
+
+
+# Turn remote photo URLs into local files through the cache. A cached file
+# is used as it is until it was last checked more than max_age seconds ago
+# (None: never); then the server is asked (If-None-Match /
+# If-Modified-Since) whether it changed. Yields (url, local_path) as each
+# URL is resolved; local_path is "" when no copy could be obtained.
+def resolve_photos(conn, urls, max_age=PHOTO_REVALIDATE_AFTER, **download_options):
+    urls = [url for url in dict.fromkeys(urls) if is_remote_url(url)]
+    if not urls:
+        return
+
+    record_sql = '''
+    INSERT INTO photo_cache (url, path, etag, last_modified, last_used, checked_at) VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (url) DO UPDATE SET
+        path = excluded.path, etag = excluded.etag, last_modified = excluded.last_modified,
+        last_used = excluded.last_used, checked_at = excluded.checked_at
+    '''
+    try:
+        cached = lookup_cached_photos(conn, urls)
+        now = time.time()
+        stale = set()
+        if max_age is not None:
+            stale = {url for url, (*_, checked_at) in cached.items() if now - checked_at >= max_age}
+        validators = {url: cached[url][1:3] for url in stale}
+        hits = [url for url in urls if url in cached and url not in stale]
+        if hits:
+            conn.executemany('UPDATE photo_cache SET last_used = ? WHERE url = ?', ((now, url) for url in hits))
+            photo_cache_stats["hits"] += len(hits)
+            for url in hits:
+                yield url, cached[url][0]
+        to_download = [url for url in urls if url not in cached or url in stale]
+
+        for url, result in download_photos(to_download, validators, **download_options):
+            if result.path is None:
+                photo_cache_stats["hits"] += 1
+                photo_cache_stats["revalidated"] += 1
+                path = cached[url][0]
+            elif result.path:
+                photo_cache_stats["misses"] += 1
+                path = result.path
+            else:
+                photo_cache_stats["misses"] += 1
+                # A failed revalidation still leaves the cached copy usable
+                if url in cached:
+                    yield url, cached[url][0]
+                else:
+                    yield url, ""
+                continue
+            now = time.time()
+            conn.execute(record_sql, (url, path, result.etag, result.last_modified, now, now))
+            yield url, path
+    finally:
+        try:
+            conn.commit()
+        except sqlite3.Error as e:
+            report_error(f'Error updating photo cache: {e}')
+
+
+def normalize_photo_value(value, conn=None):
     value = (value or "").strip()
     if not value:
         return ""
     if is_remote_url(value):
-        return fetch_remote_photo(value)
+        if conn is None:
+            return fetch_remote_photo(value).path or ""
+        return dict(resolve_photos(conn, [value])).get(value, "")
     return value
 
 
-def normalize_entry_photo(entry_data):
+def normalize_entry_photo(entry_data, conn=None):
     if len(entry_data) < 9:
         return entry_data
     entry_list = list(entry_data)
-    entry_list[8] = normalize_photo_value(entry_list[8])
+    entry_list[8] = normalize_photo_value(entry_list[8], conn)
     return tuple(entry_list)
 
 
-def parse_google_contacts_csv(file_path, mapping):
-    entries = []
-    skipped = 0
+# Names store_photo_bytes gives the files it writes
+PHOTO_FILE_PATTERN = re.compile(r"[0-9a-f]{32}\.\w+")
+
+
+# Files of the photo cache with their size and when they were last used.
+# Only files the cache wrote count: ones recorded in photo_cache or named
+# like store_photo_bytes names them. Anything else in the directory is left
+# alone.
+def scan_photo_files(conn):
+    last_used = {}
+    for path, used in conn.execute('SELECT path, last_used FROM photo_cache'):
+        last_used[path] = max(last_used.get(path, 0), used)
+
+    files = []
+    with os.scandir(get_photos_dir()) as entries:
+        for entry in entries:
+            if not entry.is_file() or entry.name.startswith("."):
+                continue
+            if entry.path not in last_used and not PHOTO_FILE_PATTERN.fullmatch(entry.name):
+                continue
+            stat = entry.stat()
+            files.append((entry.path, stat.st_size, last_used.get(entry.path, stat.st_mtime)))
+    return files
+
+
+# Reclaim photo files no contact uses any more. Unused files stay on disk as
+# cache, so re-importing a contact needs no download, while all photos
+# together fit in max_bytes; past that the least recently used go first.
+# Files a contact still points to are never removed.
+def collect_photo_garbage(conn, max_bytes=PHOTO_CACHE_MAX_BYTES):
+    try:
+        referenced = {row[0] for row in conn.execute("SELECT DISTINCT photo FROM contacts WHERE photo <> ''")}
+        files = scan_photo_files(conn)
+    except (sqlite3.Error, OSError) as e:
+        report_error(f'Error scanning photo cache: {e}')
+        return 0, 0
+
+    total = sum(size for _, size, _ in files)
+    unused = sorted((item for item in files if item[0] not in referenced), key=lambda item: item[2])
+    removed = []
+    freed = 0
+    for path, size, _ in unused:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError as e:
+            report_error(f'Error removing photo "{path}": {e}')
+            continue
+        total -= size
+        freed += size
+        removed.append(path)
+
+    present = {path for path, _, _ in files} - set(removed)
+    try:
+        with conn:
+            stale = [row[0] for row in conn.execute('SELECT DISTINCT path FROM photo_cache') if row[0] not in present]
+            conn.executemany('DELETE FROM photo_cache WHERE path = ?', ((path,) for path in stale))
+    except sqlite3.Error as e:
+        report_error(f'Error updating photo cache: {e}')
+
+    if removed:
+        report(f'Removed {len(removed)} unused photos ({freed} bytes).')
+    return len(removed), freed
+
+
+def get_photo_cache_stats(conn):
+    stats = dict(photo_cache_stats)
+    try:
+        files = scan_photo_files(conn)
+        stats["entries"] = conn.execute('SELECT COUNT(*) FROM photo_cache').fetchone()[0]
+    except (sqlite3.Error, OSError) as e:
+        report_error(f'Error reading photo cache stats: {e}')
+        files = []
+        stats["entries"] = 0
+    stats["files"] = len(files)
+    stats["bytes_on_disk"] = sum(size for _, size, _ in files)
+    return stats
+
+
+# Google Contacts (and common) CSV headers for each mapping key, best first
+CSV_MAPPING_DEFAULTS = {
+    "name": ["Given Name", "First Name", "Name"],
+    "name_2": ["Family Name", "Last Name"],
+    "phone_contact": ["Phone 1 - Value", "Phone"],
+    "email": ["E-mail 1 - Value", "Email", "E-mail"],
+    "relationship": ["Group Membership", "Relationship"],
+    "other_notes": ["Notes"],
+    "whatsapp_phone": ["WhatsApp"],
+    "signal_phone": ["Signal"],
+    "telegram_handle": ["Telegram"],
+    "facebook": ["Facebook"],
+    "linkedin": ["LinkedIn"],
+    "photo": ["Photo", "Photo URL", "Photo 1 - Value"],
+    "import_key": ["Resource Name", "UID", "ID"],
+}
+
+
+# Mapping for iter_google_contacts_csv suggested from a file's headers
+def suggest_csv_mapping(headers):
+    header_lc = {header.lower(): header for header in headers}
+    mapping = {}
+    for key, preferred in CSV_MAPPING_DEFAULTS.items():
+        mapping[key] = next(
+            (header_lc[name.lower()] for name in preferred if name.lower() in header_lc), ""
+        )
+    return mapping
+
+
+def iter_google_contacts_csv(file_path, mapping):
+    for _, entry_data in iter_google_contacts_records(file_path, mapping):
+        yield entry_data
+
+
+# Rows of the CSV as (source id, entry tuple). The source id comes from the
+# column mapped to "import_key", if any, and identifies the row across
+# exports (see import_key).
+def iter_google_contacts_records(file_path, mapping):
+    key_column = mapping.get("import_key", "")
+    name_column = mapping.get("name", "")
+    name_column_2 = mapping.get("name_2", "")
+    phone_column = mapping.get("phone_contact", "")
+    email_column = mapping.get("email", "")
+    whatsapp_column = mapping.get("whatsapp_phone", "")
+    signal_column = mapping.get("signal_phone", "")
+    telegram_column = mapping.get("telegram_handle", "")
+    facebook_column = mapping.get("facebook", "")
+    linkedin_column = mapping.get("linkedin", "")
+    photo_column = mapping.get("photo", "")
+    relationship_column = mapping.get("relationship", "")
+    notes_column = mapping.get("other_notes", "")
 
     with open(file_path, newline="", encoding="utf-8-sig") as csv_file:
         reader = csv.DictReader(csv_file)
         for row in reader:
-            name_column = mapping.get("name", "")
-            name_column_2 = mapping.get("name_2", "")
-            phone_column = mapping.get("phone_contact", "")
-            email_column = mapping.get("email", "")
-            whatsapp_column = mapping.get("whatsapp_phone", "")
-            signal_column = mapping.get("signal_phone", "")
-            telegram_column = mapping.get("telegram_handle", "")
-            facebook_column = mapping.get("facebook", "")
-            linkedin_column = mapping.get("linkedin", "")
-            photo_column = mapping.get("photo", "")
-            relationship_column = mapping.get("relationship", "")
-            notes_column = mapping.get("other_notes", "")
-
             name_primary = row.get(name_column, "").strip() if name_column else ""
             name_secondary = row.get(name_column_2, "").strip() if name_column_2 else ""
             name = " ".join(part for part in [name_primary, name_secondary] if part)
@@ -259,16 +1339,18 @@ def parse_google_contacts_csv(file_path, mapping):
             telegram = row.get(telegram_column, "").strip() if telegram_column else ""
             facebook = row.get(facebook_column, "").strip() if facebook_column else ""
             linkedin = row.get(linkedin_column, "").strip() if linkedin_column else ""
-            photo_raw = row.get(photo_column, "").strip() if photo_column else ""
-            photo = normalize_photo_value(photo_raw)
+            # Remote photos are downloaded after the rows are inserted
+            photo = row.get(photo_column, "").strip() if photo_column else ""
             relationship = row.get(relationship_column, "").strip() if relationship_column else ""
             notes = row.get(notes_column, "").strip() if notes_column else ""
+            source_id = row.get(key_column, "").strip() if key_column else ""
 
+            # Rows without a name are reported as None so callers can count them
             if not name:
-                skipped += 1
+                yield source_id, None
                 continue
 
-            entry_data = (
+            yield source_id, (
                 name,
                 phone,
                 email,
@@ -281,74 +1363,589 @@ def parse_google_contacts_csv(file_path, mapping):
                 relationship,
                 notes,
             )
-            entries.append(entry_data)
 
+
+def parse_google_contacts_csv(file_path, mapping):
+    entries = []
+    skipped = 0
+    for entry_data in iter_google_contacts_csv(file_path, mapping):
+        if entry_data is None:
+            skipped += 1
+        else:
+            entries.append(entry_data)
     return entries, skipped
 
 
-def import_google_contacts(conn, table_name, file_path, mapping):
+class ImportCancelled(Exception):
+    pass
+
+
+# Import a Google Contacts CSV export into a table. The file is read as a
+# stream and inserted chunk_size rows at a time inside one transaction, so
+# memory does not grow with the file. progress, if given, is called after
+# every chunk and while photos download with a dict of counts (read,
+# imported, unchanged, skipped, photos_done, photos_total); returning False
+# cancels. Cancelling while rows are read rolls the whole import back;
+# cancelling while photos download keeps the rows and leaves the rest of
+# the photos pending.
+#
+# Each row is stored with a stable import key and a hash of its values.
+# With update (the default) a row whose key is already in the table
+# updates that contact if the row changed and is left alone otherwise, so
+# importing a newer export of the same contacts only writes what changed
+# and downloads no photos for unchanged rows. Without update every row is
+# added as a new contact.
+def import_google_contacts(conn, table_name, file_path, mapping, chunk_size=IMPORT_CHUNK_SIZE, progress=None, update=True):
+    return import_entries(
+        conn, table_name, iter_google_contacts_records(file_path, mapping), "CSV", chunk_size, progress, update
+    )
+
+
+# Identity of an imported record within its table: the source's own id when
+# it has one, else its email, phone number or name
+def import_key(entry_data, source_id=""):
+    if source_id:
+        return f"id:{source_id}"
+    phone, whatsapp, signal, email = lookup_values(entry_data)
+    if email:
+        return f"email:{email}"
+    if phone or whatsapp or signal:
+        return f"phone:{phone or whatsapp or signal}"
+    return f"name:{normalize_name(entry_data[0])}"
+
+
+# Hash of an entry as it came from the source, so an unchanged record is
+# recognised even after its photo URL was replaced by the downloaded file
+def import_hash(entry_data):
+    return hashlib.sha256("\x1f".join(value or "" for value in entry_data).encode("utf-8")).hexdigest()[:32]
+
+
+# Makes import keys unique in one file: the second record with the same key
+# gets "#2" appended, and so on. Records keep their keys across imports as
+# long as the file keeps its order.
+class ImportKeys:
+    def __init__(self):
+        self.seen = set()
+
+    def unique(self, key):
+        candidate, number = key, 1
+        while candidate in self.seen:
+            number += 1
+            candidate = f"{key}#{number}"
+        self.seen.add(candidate)
+        return candidate
+
+
+# Insert a stream of (source id, entry tuple) records (entry None for
+# skipped records) the way import_google_contacts describes. file_kind
+# names the source in errors.
+def import_entries(conn, table_name, records, file_kind, chunk_size=IMPORT_CHUNK_SIZE, progress=None, update=True):
     if not is_valid_table_name(table_name):
         return None, None, "Invalid table name."
     if not ensure_table_schema(conn, table_name):
         return None, None, "Could not update table schema."
 
-    try:
-        entries, skipped = parse_google_contacts_csv(file_path, mapping)
-    except OSError as e:
-        return None, None, f"Could not read CSV: {e}"
-    except csv.Error as e:
-        return None, None, f"Invalid CSV format: {e}"
+    counts = {"read": 0, "imported": 0, "unchanged": 0, "skipped": 0, "photos_done": 0, "photos_total": 0}
+    keys = ImportKeys()
+    existing_sql = '''
+    SELECT import_key, import_hash FROM contacts
+    WHERE group_id = (SELECT id FROM tables WHERE name = ?)
+    AND import_key IN (SELECT value FROM json_each(?))
+    '''
 
-    if not entries:
-        return 0, skipped, None
+    def report_progress():
+        if progress is not None and progress(dict(counts)) is False:
+            raise ImportCancelled()
+
+    def write(chunk):
+        if update:
+            existing = dict(conn.execute(existing_sql, (table_name, json.dumps([row[-2] for row in chunk]))))
+            changed = [row for row in chunk if existing.get(row[-2]) != row[-1]]
+            counts["unchanged"] += len(chunk) - len(changed)
+            conn.executemany(UPSERT_CONTACT_SQL, changed)
+            counts["imported"] += len(changed)
+        else:
+            conn.executemany(INSERT_IMPORTED_SQL, (row[:-2] + row[-1:] for row in chunk))
+            counts["imported"] += len(chunk)
+        chunk.clear()
 
-    insert_sql = f'''
-    INSERT INTO {table_name} (name, phone_contact, email, whatsapp_phone, signal_phone, telegram_handle, facebook, linkedin, photo, relationship, other_notes)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    '''
     try:
         with conn:
-            conn.executemany(insert_sql, entries)
-        return len(entries), skipped, None
+            chunk = []
+            for source_id, entry_data in records:
+                counts["read"] += 1
+                if entry_data is None:
+                    counts["skipped"] += 1
+                    continue
+                key = keys.unique(import_key(entry_data, source_id))
+                chunk.append((table_name, *entry_data, *lookup_values(entry_data), key, import_hash(entry_data)))
+                if len(chunk) >= chunk_size:
+                    write(chunk)
+                    report_progress()
+            if chunk:
+                write(chunk)
+            report_progress()
+    except ImportCancelled:
+        return None, None, "Import cancelled."
+    except OSError as e:
+        return None, None, f"Could not read {file_kind}: {e}"
+    except (csv.Error, ValueError) as e:
+        return None, None, f"Invalid {file_kind} format: {e}"
     except sqlite3.Error as e:
         return None, None, f"Error importing contacts: {e}"
+    finally:
+        invalidate_table_stats(table_name)
+
+    try:
+        fill_pending_photos(conn, counts, report_progress)
+    except ImportCancelled:
+        pass
+    return counts["imported"], counts["skipped"], None
+
+
+# Imported rows keep their photo URL until it has been downloaded. This
+# walks the distinct pending URLs a chunk at a time, downloading each chunk
+# concurrently, and replaces every URL with the local path (or "" on
+# failure) as its download finishes. The whole run shares one deadline.
+def fill_pending_photos(conn, counts=None, report_progress=None, chunk_size=500, flush_every=25):
+    counts = counts if counts is not None else {"photos_done": 0, "photos_total": 0}
+    select_sql = f'''
+    SELECT DISTINCT photo FROM contacts
+    WHERE {PENDING_PHOTO} AND photo > ? ORDER BY photo LIMIT ?
+    '''
+    update_sql = f'UPDATE contacts SET photo = ? WHERE photo = ? AND {PENDING_PHOTO}'
+    end = time.monotonic() + PHOTO_DOWNLOAD_DEADLINE
+    try:
+        counts["photos_total"] = conn.execute(
+            f'SELECT COUNT(DISTINCT photo) FROM contacts WHERE {PENDING_PHOTO}'
+        ).fetchone()[0]
+        after = ""
+        while True:
+            urls = [row[0] for row in conn.execute(select_sql, (after, chunk_size))]
+            if not urls:
+                return
+            after = urls[-1]
+
+            pending = []
+            remaining = max(end - time.monotonic(), 0)
+            for url, local_path in resolve_photos(conn, urls, deadline=remaining):
+                pending.append((local_path, url))
+                counts["photos_done"] += 1
+                if len(pending) >= flush_every:
+                    with conn:
+                        conn.executemany(update_sql, pending)
+                    invalidate_search_cache()
+                    pending.clear()
+                    if report_progress is not None:
+                        report_progress()
+            if pending:
+                with conn:
+                    conn.executemany(update_sql, pending)
+                invalidate_search_cache()
+            # URLs that are not valid remote addresses can never be fetched
+            with conn:
+                conn.executemany(update_sql, (("", url) for url in urls if not is_remote_url(url)))
+            if report_progress is not None:
+                report_progress()
+    except sqlite3.Error as e:
+        report_error(f'Error saving imported photos: {e}')
+    finally:
+        # Failed downloads clear the photo, which changes the photo counts
+        if counts["photos_total"]:
+            invalidate_table_stats()
+
+
+# vCard 3.0 and 4.0 import and export. Cards are read one at a time from a
+# stream of unfolded lines, so file size does not matter, and embedded
+# photos go straight into the photo store.
+VCARD_MESSENGERS = {
+    "whatsapp": "whatsapp_phone",
+    "signal": "signal_phone",
+    "sgnl": "signal_phone",
+    "telegram": "telegram_handle",
+    "tg": "telegram_handle",
+}
+VCARD_PROFILES = {"facebook": "facebook", "linkedin": "linkedin"}
+
+
+class VCardError(ValueError):
+    pass
+
+
+# Lines of a vCard file with folded continuation lines joined back up
+def iter_vcard_lines(vcard_file):
+    current = None
+    for line in vcard_file:
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+            continue
+        if current:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+# Split "group.NAME;PARAM=a,b;FLAG:value" into ("NAME", {"PARAM": ["a", "b"],
+# "TYPE": ["flag"]}, "value"). Parameter names are upper-cased and values
+# lower-cased; 3.0 bare parameters count as TYPE.
+def parse_vcard_property(line):
+    quoted = False
+    for index, ch in enumerate(line):
+        if ch == '"':
+            quoted = not quoted
+        elif ch == ":" and not quoted:
+            break
+    else:
+        raise VCardError(f"Line without a value: {line[:40]}")
+    head, value = line[:index], line[index + 1:]
+    name, *raw_params = head.split(";")
+    params = {}
+    for param in raw_params:
+        key, _, values = param.partition("=")
+        if not values:
+            key, values = "TYPE", key
+        params.setdefault(key.upper(), []).extend(
+            item.strip('"').lower() for item in values.split(",")
+        )
+    return name.rpartition(".")[2].upper(), params, value
+
+
+# Each card as a list of (name, params, value), in file order
+def iter_vcards(file_path):
+    with open(file_path, encoding="utf-8-sig") as vcard_file:
+        card = None
+        for line in iter_vcard_lines(vcard_file):
+            if not line.strip():
+                continue
+            name, params, value = parse_vcard_property(line)
+            if name == "BEGIN" and value.upper() == "VCARD":
+                card = []
+            elif name == "END" and value.upper() == "VCARD":
+                if card is not None:
+                    yield card
+                card = None
+            elif card is not None:
+                card.append((name, params, value))
+
+
+def unescape_vcard_text(value):
+    return re.sub(r"\\(.)", lambda match: "\n" if match.group(1) in "nN" else match.group(1), value)
+
+
+def escape_vcard_text(value):
+    return (
+        value.replace("\\", "\\\\").replace(",", "\\,").replace(";", "\\;")
+        .replace("\r\n", "\\n").replace("\n", "\\n")
+    )
+
+
+# Store an embedded PHOTO in the photo store and return its path. Remote
+# URIs are kept and downloaded after the import like CSV photo URLs.
+def vcard_photo(params, value):
+    value = value.strip()
+    content_type = ""
+    if value.lower().startswith("data:"):
+        header, _, value = value.partition(",")
+        if ";base64" not in header.lower():
+            return ""
+        content_type = header[5:].split(";")[0]
+    elif "b" in params.get("ENCODING", []) or "base64" in params.get("ENCODING", []):
+        types = [item for item in params.get("TYPE", []) if item not in ("pref", "work", "home")]
+        if types:
+            content_type = types[0] if "/" in types[0] else f"image/{types[0]}"
+    else:
+        return value if is_remote_url(value) else ""
+    try:
+        content = base64.b64decode(value, validate=False)
+    except (binascii.Error, ValueError):
+        return ""
+    if not content:
+        return ""
+    return store_photo_bytes(content, guess_photo_extension("", content_type))
+
+
+# Map one card onto CONTACT_FIELDS; cards without a name give None
+def vcard_entry(card):
+    values = dict.fromkeys(CONTACT_FIELDS, "")
+    structured_name = ""
+    for name, params, value in card:
+        if name == "FN" and not values["name"]:
+            values["name"] = unescape_vcard_text(value).strip()
+        elif name == "N" and not structured_name:
+            family, given, additional = (re.split(r"(?<!\\);", value) + ["", "", ""])[:3]
+            structured_name = " ".join(
+                unescape_vcard_text(part).strip() for part in (given, additional, family) if part.strip()
+            )
+        elif name == "TEL" and not values["phone_contact"]:
+            values["phone_contact"] = value.strip().removeprefix("tel:")
+        elif name == "EMAIL" and not values["email"]:
+            values["email"] = unescape_vcard_text(value).strip()
+        elif name in ("IMPP", "X-SOCIALPROFILE", "URL"):
+            scheme, _, handle = value.strip().partition(":")
+            field = VCARD_MESSENGERS.get(scheme.lower()) if name == "IMPP" else None
+            if field is None:
+                # Profiles are recognised by their TYPE or by the site they point to
+                text = " ".join(params.get("TYPE", [])) + " " + value.lower()
+                field = next((field for site, field in VCARD_PROFILES.items() if site in text), None)
+                handle = unescape_vcard_text(value).strip()
+            if field is not None and not values[field]:
+                values[field] = handle.strip()
+        elif name in ("X-WHATSAPP", "X-SIGNAL", "X-TELEGRAM"):
+            field = VCARD_MESSENGERS[name[2:].lower()]
+            values[field] = values[field] or unescape_vcard_text(value).strip()
+        elif name == "PHOTO" and not values["photo"]:
+            values["photo"] = vcard_photo(params, value)
+        elif name in ("X-RELATIONSHIP", "CATEGORIES") and not values["relationship"]:
+            values["relationship"] = unescape_vcard_text(re.split(r"(?<!\\),", value)[0]).strip()
+        elif name == "NOTE":
+            note = unescape_vcard_text(value).strip()
+            values["other_notes"] = "\n".join(part for part in (values["other_notes"], note) if part)
+    values["name"] = values["name"] or structured_name
+    if not values["name"]:
+        return None
+    return tuple(values[field] for field in CONTACT_FIELDS)
+
+
+def iter_vcard_entries(file_path):
+    for _, entry_data in iter_vcard_records(file_path):
+        yield entry_data
+
+
+# Cards as (UID, entry tuple)
+def iter_vcard_records(file_path):
+    for card in iter_vcards(file_path):
+        uid = next((value.strip() for name, _, value in card if name == "UID"), "")
+        yield uid, vcard_entry(card)
+
+
+# Import a .vcf file into a table, streaming it like import_google_contacts
+def import_vcards(conn, table_name, file_path, chunk_size=IMPORT_CHUNK_SIZE, progress=None, update=True):
+    return import_entries(
+        conn, table_name, iter_vcard_records(file_path), "vCard", chunk_size, progress, update
+    )
+
+
+# Fold a content line into lines of at most 75 octets
+def fold_vcard_line(line):
+    if line.isascii():
+        if len(line) <= 75:
+            return line
+        parts = [line[:75]] + [line[index:index + 74] for index in range(75, len(line), 74)]
+        return "\r\n ".join(parts)
+    parts = []
+    current, size = "", 0
+    for ch in line:
+        width = len(ch.encode("utf-8"))
+        if size + width > 75:
+            parts.append(current)
+            current, size = " ", 1
+        current += ch
+        size += width
+    parts.append(current)
+    return "\r\n".join(parts)
+
+
+def vcard_photo_line(photo, version):
+    if is_remote_url(photo):
+        return f"PHOTO:{photo}" if version == "4.0" else f"PHOTO;VALUE=uri:{photo}"
+    try:
+        with open(photo, "rb") as photo_file:
+            content = base64.b64encode(photo_file.read()).decode("ascii")
+    except OSError:
+        return None
+    content_type = mimetypes.guess_type(photo)[0] or "image/jpeg"
+    if version == "4.0":
+        return f"PHOTO:data:{content_type};base64,{content}"
+    return f"PHOTO;ENCODING=b;TYPE={content_type.split('/')[-1].upper()}:{content}"
+
+
+# Content lines of one card for an entry row laid out as ENTRY_COLUMNS
+def vcard_lines(row, version):
+    entry = dict(zip(ENTRY_COLUMNS, row))
+    words = entry["name"].split()
+    family, given = (words[-1], " ".join(words[:-1])) if len(words) > 1 else ("", entry["name"])
+    lines = [
+        "BEGIN:VCARD",
+        f"VERSION:{version}",
+        f"FN:{escape_vcard_text(entry['name'])}",
+        f"N:{escape_vcard_text(family)};{escape_vcard_text(given)};;;",
+    ]
+    if entry["phone_contact"]:
+        lines.append(f"TEL;TYPE=CELL:{entry['phone_contact']}")
+    if entry["email"]:
+        lines.append(f"EMAIL;TYPE=INTERNET:{escape_vcard_text(entry['email'])}")
+    for scheme, field in (("whatsapp", "whatsapp_phone"), ("signal", "signal_phone"), ("telegram", "telegram_handle")):
+        if entry[field]:
+            lines.append(f"IMPP:{scheme}:{entry[field]}")
+    for site in VCARD_PROFILES:
+        if entry[site]:
+            lines.append(f"URL;TYPE={site}:{entry[site]}")
+    if entry["photo"]:
+        photo_line = vcard_photo_line(entry["photo"], version)
+        if photo_line:
+            lines.append(photo_line)
+    if entry["relationship"]:
+        lines.append(f"X-RELATIONSHIP:{escape_vcard_text(entry['relationship'])}")
+    if entry["other_notes"]:
+        lines.append(f"NOTE:{escape_vcard_text(entry['other_notes'])}")
+    if entry["last_modified"]:
+        lines.append(f"REV:{entry['last_modified'].replace(' ', 'T').replace('-', '').replace(':', '')}Z")
+    lines.append("END:VCARD")
+    return lines
+
+
+# Export a table as a .vcf file, streaming rows from a cursor. Local photos
+# are embedded. Returns (exported, error).
+def export_vcards(conn, table_name, file_path, version="3.0"):
+    if not is_valid_table_name(table_name):
+        return None, "Invalid table name."
+    if version not in ("3.0", "4.0"):
+        return None, f"Unsupported vCard version {version}."
+    exported = 0
+    try:
+        cursor = conn.execute(
+            f'SELECT {ENTRY_SELECT} FROM contacts c '
+            'WHERE c.group_id = (SELECT id FROM tables WHERE name = ?) ORDER BY c.id',
+            (table_name,),
+        )
+        with open(file_path, "w", encoding="utf-8", newline="") as vcard_file:
+            for row in cursor:
+                for line in vcard_lines(row, version):
+                    vcard_file.write(fold_vcard_line(line))
+                    vcard_file.write("\r\n")
+                exported += 1
+    except OSError as e:
+        return None, f"Could not write vCard: {e}"
+    except sqlite3.Error as e:
+        return None, f"Error exporting contacts: {e}"
+    return exported, None
+
+
+# Run "SELECT columns FROM source" ordered by order_by, returning one page of
+# up to limit rows that sort after after_key. The ordering columns are
+# fetched as extra trailing columns to build the key of the next page and
+# are stripped from the returned rows. next_key is None on the last page.
+# source must end in a WHERE clause; limit=None returns everything.
+def fetch_keyset_page(conn, columns, source, params, order_by, after_key=None, limit=None):
+    keys = ", ".join(order_by)
+    sql = f"SELECT {columns}, {keys} FROM {source}"
+    params = tuple(params)
+    if after_key is not None:
+        if not isinstance(after_key, (tuple, list)):
+            after_key = (after_key,)
+        sql += f" AND ({keys}) > ({', '.join('?' for _ in order_by)})"
+        params += tuple(after_key)
+    sql += f" ORDER BY {keys}"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params += (limit,)
+
+    rows = conn.execute(sql, params).fetchall()
+    width = len(order_by)
+    next_key = None
+    if limit is not None and rows and len(rows) == limit:
+        next_key = tuple(rows[-1][-width:])
+    return [row[:-width] for row in rows], next_key
+
+
+# Walk a paged query to the end, yielding rows one at a time while holding
+# only chunk_size of them in memory
+def iter_pages(fetch_page, chunk_size):
+    after_key = None
+    while True:
+        rows, after_key = fetch_page(after_key, chunk_size)
+        yield from rows
+        if after_key is None:
+            return
+
+
+def entries_query(table_name):
+    source = 'contacts c WHERE c.group_id = (SELECT id FROM tables WHERE name = ?)'
+    return ENTRY_SELECT, source, (table_name,), ("c.id",)
+
 
 # Fetch entries from a specific table
 def fetch_entries(conn, table_name):
+    return fetch_entries_page(conn, table_name)[0]
+
+
+# One page of a table's entries in id order. Pass the returned key as
+# after_key to get the next page; it is None after the last one.
+def fetch_entries_page(conn, table_name, after_key=None, limit=None):
     if not is_valid_table_name(table_name):
-        print('Invalid table name.')
-        return []
-    ensure_table_schema(conn, table_name)
+        report_error('Invalid table name.')
+        return [], None
+    if not ensure_table_schema(conn, table_name):
+        return [], None
     try:
-        cursor = conn.execute(f'SELECT * FROM {table_name}')
-        entries = cursor.fetchall()
-        return entries
+        return fetch_keyset_page(conn, *entries_query(table_name), after_key, limit)
     except sqlite3.Error as e:
-        print(f'Error querying table: {e}')
-        return []
+        report_error(f'Error querying table: {e}')
+        return [], None
+
+
+# One entry of a table by id, or None if the table has no such entry
+def fetch_entry(conn, table_name, entry_id):
+    if not ensure_table_schema(conn, table_name):
+        return None
+    try:
+        cursor = conn.execute(
+            f'''
+            SELECT {ENTRY_SELECT} FROM contacts c
+            WHERE c.id = ? AND c.group_id = (SELECT id FROM tables WHERE name = ?)
+            ''',
+            (entry_id, table_name),
+        )
+        return cursor.fetchone()
+    except sqlite3.Error as e:
+        report_error(f'Error querying table: {e}')
+        return None
+
+
+def iter_entries(conn, table_name, chunk_size=500):
+    return iter_pages(
+        lambda after_key, limit: fetch_entries_page(conn, table_name, after_key, limit),
+        chunk_size,
+    )
+
+
+def count_entries(conn, table_name):
+    try:
+        cursor = conn.execute(
+            'SELECT COUNT(*) FROM contacts WHERE group_id = (SELECT id FROM tables WHERE name = ?)',
+            (table_name,),
+        )
+        return cursor.fetchone()[0]
+    except sqlite3.Error as e:
+        report_error(f'Error counting entries: {e}')
+        return 0
 
 # Edit an entry in a specific table
 def edit_entry(conn, table_name, entry_id, entry_data):
     if not is_valid_table_name(table_name):
-        print('Invalid table name.')
+        report_error('Invalid table name.')
         return False
     if not ensure_table_schema(conn, table_name):
         return False
 
-    entry_data = normalize_entry_photo(entry_data)
+    entry_data = normalize_entry_photo(entry_data, conn)
 
-    update_sql = f'''
-    UPDATE {table_name}
-    SET name = ?, phone_contact = ?, email = ?, whatsapp_phone = ?, signal_phone = ?, telegram_handle = ?, facebook = ?, linkedin = ?, photo = ?, relationship = ?, other_notes = ?, last_modified = CURRENT_TIMESTAMP
-    WHERE id = ?
+    update_sql = '''
+    UPDATE contacts
+    SET name = ?, phone_contact = ?, email = ?, whatsapp_phone = ?, signal_phone = ?, telegram_handle = ?, facebook = ?, linkedin = ?, photo = ?, relationship = ?, other_notes = ?,
+        phone_norm = ?, whatsapp_norm = ?, signal_norm = ?, email_norm = ?, last_modified = CURRENT_TIMESTAMP
+    WHERE id = ? AND group_id = (SELECT id FROM tables WHERE name = ?)
     '''
     try:
         with conn:
-            conn.execute(update_sql, (*entry_data, entry_id))
-        print(f'Entry {entry_id} updated in table "{table_name}".')
+            conn.execute(update_sql, (*entry_data, *lookup_values(entry_data), entry_id, table_name))
+        invalidate_table_stats(table_name)
+        report(f'Entry {entry_id} updated in table "{table_name}".')
         return True
     except sqlite3.Error as e:
-        print(f'Error updating entry: {e}')
+        report_error(f'Error updating entry: {e}')
         return False
 
 
@@ -356,96 +1953,615 @@ def edit_entry(conn, table_name, entry_id, entry_data):
 # Delete an entry from a specific table
 def delete_entry(conn, table_name, entry_id):
     if not is_valid_table_name(table_name):
-        print('Invalid table name.')
+        report_error('Invalid table name.')
         return False
-    delete_sql = f'DELETE FROM {table_name} WHERE id = ?'
+    delete_sql = 'DELETE FROM contacts WHERE id = ? AND group_id = (SELECT id FROM tables WHERE name = ?)'
     try:
         with conn:
-            conn.execute(delete_sql, (entry_id,))
-            print(f'Entry {entry_id} deleted from table "{table_name}".')
-            return True
+            conn.execute(delete_sql, (entry_id, table_name))
+        # Only once committed, so no search caches what was just deleted
+        invalidate_table_stats(table_name)
+        report(f'Entry {entry_id} deleted from table "{table_name}".')
+        return True
     except sqlite3.Error as e:
-        print(f'Error deleting entry: {e}')
+        report_error(f'Error deleting entry: {e}')
         return False
 
+# Bulk operations on the entries of one table. Each runs as a single
+# set-based statement in one transaction, with the ids passed as one JSON
+# array, and returns the number of entries it changed (None on error).
+ENTRY_IDS_SQL = 'SELECT value FROM json_each(:ids)'
+BULK_EDIT_FIELDS = ("relationship", "other_notes")
+
+# A moved or copied contact keeps its import key unless the target table
+# already has a contact with that key
+COPIED_FIELDS = CONTACT_FIELDS + tuple(LOOKUP_FIELDS) + ("created_at", "import_hash")
+TARGET_IMPORT_KEY_SQL = '''
+    CASE WHEN EXISTS (
+        SELECT 1 FROM contacts other WHERE other.group_id = :target AND other.import_key = contacts.import_key
+    ) THEN NULL ELSE contacts.import_key END
+'''
+
+
+# Group id of target_table, once both tables are known to exist
+def target_group_id(conn, table_name, target_table):
+    if not ensure_table_schema(conn, table_name) or not ensure_table_schema(conn, target_table):
+        return None
+    return conn.execute('SELECT id FROM tables WHERE name = ?', (target_table,)).fetchone()[0]
+
+
+def delete_entries(conn, table_name, entry_ids):
+    if not ensure_table_schema(conn, table_name):
+        return None
+    delete_sql = f'''
+    DELETE FROM contacts
+    WHERE group_id = (SELECT id FROM tables WHERE name = :source) AND id IN ({ENTRY_IDS_SQL})
+    '''
+    try:
+        with conn:
+            deleted = conn.execute(delete_sql, {"source": table_name, "ids": json.dumps(list(entry_ids))}).rowcount
+        invalidate_table_stats(table_name)
+        report(f'{deleted} entries deleted from table "{table_name}".')
+        return deleted
+    except sqlite3.Error as e:
+        report_error(f'Error deleting entries: {e}')
+        return None
+
+
+# Set fields from BULK_EDIT_FIELDS (such as {"relationship": "Family"}) to
+# the same value on every given entry
+def update_entries(conn, table_name, entry_ids, values):
+    unknown = set(values) - set(BULK_EDIT_FIELDS)
+    if unknown or not values:
+        report_error(f'Only {", ".join(BULK_EDIT_FIELDS)} can be set on several entries.')
+        return None
+    if not ensure_table_schema(conn, table_name):
+        return None
+    fields = [field for field in BULK_EDIT_FIELDS if field in values]
+    update_sql = f'''
+    UPDATE contacts
+    SET {", ".join(f"{field} = :{field}" for field in fields)}, last_modified = CURRENT_TIMESTAMP
+    WHERE group_id = (SELECT id FROM tables WHERE name = :source) AND id IN ({ENTRY_IDS_SQL})
+    '''
+    params = {field: values[field] for field in fields}
+    params.update(source=table_name, ids=json.dumps(list(entry_ids)))
+    try:
+        with conn:
+            updated = conn.execute(update_sql, params).rowcount
+        invalidate_table_stats(table_name)
+        report(f'{updated} entries updated in table "{table_name}".')
+        return updated
+    except sqlite3.Error as e:
+        report_error(f'Error updating entries: {e}')
+        return None
+
+
+# Move entries to another table. They keep their ids and creation dates.
+def move_entries(conn, table_name, entry_ids, target_table):
+    if table_name == target_table:
+        report_error('Entries are already in that table.')
+        return None
+    try:
+        target = target_group_id(conn, table_name, target_table)
+        if target is None:
+            return None
+        move_sql = f'''
+        UPDATE contacts
+        SET group_id = :target, import_key = {TARGET_IMPORT_KEY_SQL}, last_modified = CURRENT_TIMESTAMP
+        WHERE group_id = (SELECT id FROM tables WHERE name = :source) AND id IN ({ENTRY_IDS_SQL})
+        '''
+        with conn:
+            moved = conn.execute(
+                move_sql, {"target": target, "source": table_name, "ids": json.dumps(list(entry_ids))}
+            ).rowcount
+        invalidate_table_stats(table_name)
+        invalidate_table_stats(target_table)
+        report(f'{moved} entries moved from table "{table_name}" to "{target_table}".')
+        return moved
+    except sqlite3.Error as e:
+        report_error(f'Error moving entries: {e}')
+        return None
+
+
+# Copy entries into another table (or the same one) as new contacts with the
+# creation dates of the originals
+def copy_entries(conn, table_name, entry_ids, target_table):
+    try:
+        target = target_group_id(conn, table_name, target_table)
+        if target is None:
+            return None
+        copy_sql = f'''
+        INSERT INTO contacts (group_id, {", ".join(COPIED_FIELDS)}, import_key)
+        SELECT :target, {", ".join(COPIED_FIELDS)}, {TARGET_IMPORT_KEY_SQL}
+        FROM contacts
+        WHERE group_id = (SELECT id FROM tables WHERE name = :source) AND id IN ({ENTRY_IDS_SQL})
+        ORDER BY id
+        '''
+        with conn:
+            copied = conn.execute(
+                copy_sql, {"target": target, "source": table_name, "ids": json.dumps(list(entry_ids))}
+            ).rowcount
+        invalidate_table_stats(target_table)
+        report(f'{copied} entries copied from table "{table_name}" to "{target_table}".')
+        return copied
+    except sqlite3.Error as e:
+        report_error(f'Error copying entries: {e}')
+        return None
+
+
 # Delete a table
 def delete_table(conn, table_name):
     if not is_valid_table_name(table_name):
-        print('Invalid table name.')
+        report_error('Invalid table name.')
         return False
-    drop_table_sql = f'DROP TABLE IF EXISTS {table_name}'
     try:
         with conn:
-            conn.execute(drop_table_sql)
+            conn.execute(
+                'DELETE FROM contacts WHERE group_id = (SELECT id FROM tables WHERE name = ?)',
+                (table_name,),
+            )
             conn.execute('DELETE FROM tables WHERE name = ?', (table_name,))
-            print(f'Table "{table_name}" and its metadata deleted.')
-            return True
+            report(f'Table "{table_name}" and its metadata deleted.')
+        invalidate_table_stats(table_name)
+        if isinstance(conn, StoreConnection):
+            conn.known_tables.discard(table_name)
     except sqlite3.Error as e:
-        print(f'Error deleting table: {e}')
+        report_error(f'Error deleting table: {e}')
         return False
+    collect_photo_garbage(conn)
+    return True
 
 # Combine tables
-def combine_tables(conn, table_names):
+def combine_tables(conn, table_names, dedupe=False):
+    return list(iter_combined_tables(conn, table_names, dedupe=dedupe))
+
+
+# Columns of combined and search results: an entry plus the table it came from
+RESULT_SELECT = f"{ENTRY_SELECT}, t.name AS source_table"
+
+# Combined results are ordered by name, ignoring ASCII case like SQLite's
+# NOCASE collation, then by id. contacts_group_sort_idx serves this order
+# for a single group without sorting.
+COMBINE_ORDER = ("c.name COLLATE NOCASE", "c.id")
+NOCASE_FOLD = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+
+def combine_sort_key(row):
+    return row[1].translate(NOCASE_FOLD), row[0]
+
+
+def combined_query(valid_tables):
+    placeholders = ", ".join("?" for _ in valid_tables)
+    source = f"contacts c JOIN tables t ON t.id = c.group_id WHERE t.name IN ({placeholders})"
+    return RESULT_SELECT, source, valid_tables, COMBINE_ORDER
+
+
+def combine_table_names(table_names):
     if len(table_names) < 2:
-        print('Select at least two tables to combine.')
+        report_error('Select at least two tables to combine.')
         return []
     valid_tables = [name for name in table_names if is_valid_table_name(name)]
     if len(valid_tables) < 2:
-        print('Invalid table names selected.')
+        report_error('Invalid table names selected.')
         return []
-    
-    for table_name in valid_tables:
-        if not ensure_table_schema(conn, table_name):
-            return []
+    return valid_tables
 
-    # Create a query for each table that includes the source table name
-    queries = [f"SELECT *, '{name}' AS source_table FROM {name}" for name in valid_tables]
-    combined_query = ' UNION ALL '.join(queries)
-    
-    try:
-        cursor = conn.execute(combined_query)
-        combined_data = cursor.fetchall()
-        combined_data.sort(key=lambda x: x[1])  # Assuming the second column is 'name'
-        # Output the result to the console
 
+# One page of the combined tables, ordered by name
+def combine_tables_page(conn, table_names, after_key=None, limit=None):
+    valid_tables = combine_table_names(table_names)
+    if not valid_tables:
+        return [], None
 
-        return combined_data
+    try:
+        return fetch_keyset_page(conn, *combined_query(valid_tables), after_key, limit)
     except sqlite3.Error as e:
-        print(f'Error combining tables: {e}')
-        return []
-
-
+        report_error(f'Error combining tables: {e}')
+        return [], None
+
+
+# Stream the combined tables in name order. Each table is read through its
+# own cursor, already sorted by the index, and the cursors are merged, so
+# the first rows arrive at once and only one row per table is held in
+# memory. With dedupe, contacts that appear in several tables with the same
+# name, phone and email come out once, with all their tables listed in the
+# source column.
+def iter_combined_tables(conn, table_names, chunk_size=500, dedupe=False):
+    valid_tables = combine_table_names(table_names)
+    if not valid_tables:
+        return
+
+    sql = f'''
+    SELECT {RESULT_SELECT} FROM contacts c JOIN tables t ON t.id = c.group_id
+    WHERE c.group_id = (SELECT id FROM tables WHERE name = ?)
+    ORDER BY {", ".join(COMBINE_ORDER)}
+    '''
+    try:
+        cursors = []
+        for table_name in dict.fromkeys(valid_tables):
+            cursor = conn.execute(sql, (table_name,))
+            cursor.arraysize = chunk_size
+            cursors.append(iter_cursor(cursor))
+        rows = heapq.merge(*cursors, key=combine_sort_key)
+        yield from (collapse_duplicates(rows) if dedupe else rows)
+    except sqlite3.Error as e:
+        report_error(f'Error combining tables: {e}')
+
+
+def iter_cursor(cursor):
+    while True:
+        rows = cursor.fetchmany()
+        if not rows:
+            return
+        yield from rows
+
+
+# Contacts that are the same person: equal names (as ordered), phone digits
+# and lowercased email
+def duplicate_key(row):
+    phone = "".join(ch for ch in row[2] or "" if ch.isdigit())
+    email = (row[3] or "").strip().lower()
+    return row[1].translate(NOCASE_FOLD).strip(), phone, email
+
+
+# Merge rows of the same contact from different tables. Rows arrive sorted
+# by name, so duplicates sit within one run of equal names and only that
+# run is buffered.
+def collapse_duplicates(rows):
+    run_name = None
+    run = {}
+    for row in rows:
+        name = row[1].translate(NOCASE_FOLD)
+        if name != run_name:
+            yield from (first[:-1] + (", ".join(sources),) for first, sources in run.values())
+            run_name = name
+            run = {}
+        key = duplicate_key(row)
+        if key in run:
+            sources = run[key][1]
+            if row[-1] not in sources:
+                sources.append(row[-1])
+        else:
+            run[key] = (row, [row[-1]])
+    yield from (first[:-1] + (", ".join(sources),) for first, sources in run.values())
 
 
 # Search tables
 def search_tables(conn, search_term, table_names, search_type='name'):
+    return search_tables_page(conn, search_term, table_names, search_type)[0]
+
+
+# One page of search results. Name and relationship results come grouped by
+# table; 'all' results come best match first, and 'fuzzy' results are the
+# best limit (default FUZZY_SEARCH_LIMIT) matches in one page.
+def search_tables_page(conn, search_term, table_names, search_type='name', after_key=None, limit=None):
     if not table_names:
-        print('No tables selected for search.')
-        return []
+        report_error('No tables selected for search.')
+        return [], None
+
+    valid_tables = [name for name in table_names if is_valid_table_name(name)]
+    if not valid_tables:
+        return [], None
+
+    placeholders = ", ".join("?" for _ in valid_tables)
+    base = f"contacts c JOIN tables t ON t.id = c.group_id WHERE t.name IN ({placeholders})"
+    pattern = f'%{search_term}%'
+
+    if search_type == 'all':
+        match_query = build_match_query(search_term)
+        if not match_query:
+            # Nothing to rank by: same result as an empty LIKE pattern
+            source, params, order_by = base, valid_tables, ("c.group_id", "c.id")
+        elif search_index_exists(conn):
+            source = f'''
+            contacts_fts f
+            JOIN contacts c ON c.id = f.rowid
+            JOIN tables t ON t.id = c.group_id
+            WHERE contacts_fts MATCH ? AND t.name IN ({placeholders})
+            '''
+            params = (match_query, *valid_tables)
+            order_by = (f"bm25(contacts_fts, {SEARCH_WEIGHTS})", "c.id")
+        else:
+            condition = " OR ".join(f"c.{field} LIKE ?" for field in SEARCH_FIELDS)
+            source = f"{base} AND ({condition})"
+            pattern = f'%{search_term.strip()}%'
+            params = (*valid_tables, *(pattern for _ in SEARCH_FIELDS))
+            order_by = ("c.group_id", "c.id")
+    elif search_type == 'name':
+        source, params, order_by = f"{base} AND c.name LIKE ?", (*valid_tables, pattern), ("c.group_id", "c.id")
+    elif search_type == 'relationship':
+        source, params, order_by = f"{base} AND c.relationship LIKE ?", (*valid_tables, pattern), ("c.group_id", "c.id")
+    elif search_type == 'fuzzy':
+        # Ranked top matches (at most limit), always a single page
+        return fuzzy_search(conn, search_term, valid_tables, limit or FUZZY_SEARCH_LIMIT), None
+    else:
+        return [], None
+
+    try:
+        return fetch_keyset_page(conn, RESULT_SELECT, source, params, order_by, after_key, limit)
+    except sqlite3.Error as e:
+        report_error(f'Error searching tables: {e}')
+        return [], None
+
+
+def iter_search_tables(conn, search_term, table_names, search_type='name', chunk_size=500):
+    return iter_pages(
+        lambda after_key, limit: search_tables_page(conn, search_term, table_names, search_type, after_key, limit),
+        chunk_size,
+    )
+
+# Recent search results, most recently used last, keyed by search type,
+# tables and term. Only complete results of at most SEARCH_CACHE_MAX_ROWS
+# rows are kept. Every write drops the whole cache (invalidate_table_stats
+# calls invalidate_search_cache).
+SEARCH_CACHE_SIZE = 32
+SEARCH_CACHE_MAX_ROWS = 5000
+SEARCH_FILTER_COLUMNS = {
+    'name': ENTRY_COLUMNS.index("name"),
+    'relationship': ENTRY_COLUMNS.index("relationship"),
+}
+search_cache = {"generation": 0, "results": OrderedDict()}
+search_cache_lock = threading.Lock()
+
+
+def invalidate_search_cache():
+    with search_cache_lock:
+        search_cache["generation"] += 1
+        search_cache["results"].clear()
+
+
+def search_cache_key(search_term, table_names, search_type):
+    return search_type, tuple(sorted(set(table_names))), search_term
+
+
+# LIKE matches the term as a substring, ignoring ASCII case only
+def like_term(search_term):
+    return search_term.translate(NOCASE_FOLD)
+
+
+# Cached results for a search, or None. A name or relationship search whose
+# term contains an earlier cached term is answered by filtering that
+# term's results, which hold every row the longer term can match. 'all'
+# results are ranked per term and are only reused as they are.
+def cached_search(search_term, table_names, search_type='name'):
+    key = search_cache_key(search_term, table_names, search_type)
+    with search_cache_lock:
+        results = search_cache["results"]
+        if key in results:
+            results.move_to_end(key)
+            return results[key]
+        column = SEARCH_FILTER_COLUMNS.get(search_type)
+        if column is None or "%" in search_term or "_" in search_term:
+            return None
+        term = like_term(search_term)
+        narrowest = None
+        for (cached_type, cached_tables, cached_term), rows in results.items():
+            if (
+                cached_type == search_type and cached_tables == key[1]
+                and "%" not in cached_term and "_" not in cached_term
+                and like_term(cached_term) in term
+                and (narrowest is None or len(rows) < len(narrowest))
+            ):
+                narrowest = rows
+    if narrowest is None:
+        return None
+    return [row for row in narrowest if term in like_term(row[column] or "")]
+
+
+def store_search_results(key, rows, generation):
+    with search_cache_lock:
+        # Results read before a write must not outlive it
+        if generation != search_cache["generation"]:
+            return
+        results = search_cache["results"]
+        results[key] = rows
+        results.move_to_end(key)
+        while len(results) > SEARCH_CACHE_SIZE:
+            results.popitem(last=False)
+
+
+# iter_search_tables through the search cache: cached (or narrowed) results
+# come from memory, and a search read to the end is cached for next time
+def iter_cached_search(conn, search_term, table_names, search_type='name', chunk_size=500):
+    rows = cached_search(search_term, table_names, search_type)
+    if rows is not None:
+        yield from rows
+        return
+
+    key = search_cache_key(search_term, table_names, search_type)
+    with search_cache_lock:
+        generation = search_cache["generation"]
+    collected = []
+    for row in iter_search_tables(conn, search_term, table_names, search_type, chunk_size):
+        if collected is not None:
+            collected.append(row)
+            if len(collected) > SEARCH_CACHE_MAX_ROWS:
+                collected = None
+        yield row
+    if collected is not None:
+        store_search_results(key, collected, generation)
+
+
+# Turn free text into an FTS5 query: every word must match as a prefix of
+# some word in any indexed field
+def build_match_query(search_term):
+    words = re.findall(r"\w+", search_term or "")
+    return " ".join(f'"{word}"*' for word in words)
+
+
+# Search every indexed contact field, best matches first
+def search_contacts(conn, search_term, table_names, limit=None):
+    return search_tables_page(conn, search_term, table_names, 'all', limit=limit)[0]
+
+
+# Fuzzy name search. Every word of the search term is matched against the
+# words of contact names in name_terms: exactly, as a prefix, or within one
+# typo (two for words over seven letters), with transposed letters counting
+# as one typo. Candidate words come from the trigram index: a typo changes
+# at most four of a word's padded trigrams, so only words sharing enough
+# trigrams are compared. Contacts are then found through the full-text index
+# and ranked by how well their name words match, best first.
+FUZZY_SEARCH_LIMIT = 100
+FUZZY_MAX_WORDS = 5
+FUZZY_TERMS_PER_WORD = 20
+
+
+def name_term_words(text):
+    words = (word.strip(NAME_TERM_PUNCTUATION) for word in (text or "").translate(NOCASE_FOLD).split())
+    return list(dict.fromkeys(word for word in words if word))
+
+
+# Optimal string alignment distance between a and b, or max_distance + 1
+# once it is known to be larger than max_distance
+def edit_distance(a, b, max_distance):
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    before = None
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, char_b in enumerate(b, 1):
+            distance = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                distance = min(distance, before[j - 2] + 1)
+            current[j] = distance
+        if min(current) > max_distance:
+            return max_distance + 1
+        before, previous = previous, current
+    return previous[-1]
+
+
+# {term: (similarity, contacts)} for the name words that match word best
+def similar_name_terms(conn, word):
+    terms = {}
+    folded = word.casefold()
+    for term, contacts in conn.execute(
+        'SELECT term, contacts FROM name_terms WHERE term >= ? AND term < ? ORDER BY contacts DESC LIMIT ?',
+        (word, word + "\U0010ffff", FUZZY_TERMS_PER_WORD),
+    ):
+        terms[term] = (1.0 if term == word else 0.5 + 0.4 * len(word) / len(term), contacts)
+
+    if len(word) >= 3:
+        max_distance = 1 if len(word) <= 7 else 2
+        grams = name_trigrams(word)
+        candidates = conn.execute(
+            '''
+            SELECT t.term, t.contacts FROM name_term_grams g JOIN name_terms t ON t.id = g.term_id
+            WHERE g.gram IN (SELECT value FROM json_each(?)) AND length(t.term) BETWEEN ? AND ?
+            GROUP BY t.id HAVING COUNT(*) >= ?
+            ''',
+            (
+                json.dumps(sorted(grams)), len(word) - max_distance, len(word) + max_distance,
+                max(len(grams) - 4 * max_distance, 2 * max_distance - 1),
+            ),
+        )
+        for term, contacts in candidates:
+            distance = edit_distance(folded, term.casefold(), max_distance)
+            if distance <= max_distance:
+                similarity = 1 - distance / max(len(word), len(term))
+                if similarity > terms.get(term, (0,))[0]:
+                    terms[term] = (similarity, contacts)
+
+    best = heapq.nlargest(FUZZY_TERMS_PER_WORD, terms.items(), key=lambda item: item[1])
+    # Words made only of punctuation are no phrase the full-text index knows
+    return {term: match for term, match in best if any(ch.isalnum() for ch in term)}
+
+
+def fuzzy_index_exists(conn):
+    try:
+        cursor = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'name_term_grams'")
+        return cursor.fetchone() is not None
+    except sqlite3.Error:
+        return False
 
+
+# The limit contacts of the given tables whose names best match
+# search_term, allowing typos, as search result rows
+def fuzzy_search(conn, search_term, table_names, limit=FUZZY_SEARCH_LIMIT):
     valid_tables = [name for name in table_names if is_valid_table_name(name)]
-    combined_results = []
+    words = name_term_words(search_term)[:FUZZY_MAX_WORDS]
+    if not valid_tables or not words:
+        return []
+    if not (fuzzy_index_exists(conn) and search_index_exists(conn)):
+        # Without the indexes: plain substring search
+        return search_tables_page(conn, search_term, valid_tables, 'name', limit=limit)[0]
 
-    for table_name in valid_tables:
-        if not ensure_table_schema(conn, table_name):
+    try:
+        matches = [similar_name_terms(conn, word) for word in words]
+        if not all(matches):
             return []
-        if search_type == 'name':
-            query = f"SELECT *, '{table_name}' AS source_table FROM {table_name} WHERE name LIKE ?"
-        elif search_type == 'relationship':
-            query = f"SELECT *, '{table_name}' AS source_table FROM {table_name} WHERE relationship LIKE ?"
+        if len(matches) == 1:
+            best = best_single_word_matches(conn, matches[0], valid_tables, limit)
         else:
-            continue
+            best = best_word_matches(conn, matches, valid_tables, limit)
+        rows = conn.execute(
+            f'''
+            SELECT {RESULT_SELECT} FROM contacts c JOIN tables t ON t.id = c.group_id
+            WHERE c.id IN (SELECT value FROM json_each(?))
+            ''',
+            (json.dumps(best),),
+        ).fetchall()
+        order = {contact_id: position for position, contact_id in enumerate(best)}
+        return sorted(rows, key=lambda row: order[row[0]])
+    except sqlite3.Error as e:
+        report_error(f'Error searching tables: {e}')
+        return []
+
+
+def name_match_query(terms):
+    return "name : (" + " OR ".join('"' + term.replace('"', '""') + '"' for term in terms) + ")"
 
-        try:
-            cursor = conn.execute(query, (f'%{search_term}%',))
-            combined_results.extend(cursor.fetchall())
-        except sqlite3.Error as e:
-            print(f'Error searching table {table_name}: {e}')
 
+# Contacts of the tables whose names match a full-text query. The CROSS
+# JOIN keeps the planner from scanning a table's contacts and running the
+# query for each of them.
+def name_match_sql(valid_tables, order_by=""):
+    placeholders = ", ".join("?" for _ in valid_tables)
+    return f'''
+    SELECT c.id, c.name FROM contacts_fts f
+    CROSS JOIN contacts c ON c.id = f.rowid
+    JOIN tables t ON t.id = c.group_id
+    WHERE contacts_fts MATCH ? AND t.name IN ({placeholders})
+    {order_by}
+    '''
 
-    return combined_results
 
+# Ids of the best matches for several words: every contact matching all of
+# them, ranked by the average similarity of its best matching name words,
+# then by how common those words are, then by name
+def best_word_matches(conn, matches, valid_tables, limit):
+    candidates = conn.execute(
+        name_match_sql(valid_tables),
+        (" AND ".join(name_match_query(terms) for terms in matches), *valid_tables),
+    )
 
+    def rank(candidate):
+        contact_id, name = candidate
+        name_words = name_term_words(name)
+        similarity = weight = 0
+        for terms in matches:
+            best = max((terms.get(word, (0, 0)) for word in name_words), default=(0, 0))
+            similarity += best[0]
+            weight += best[1]
+        return -similarity, -weight, (name or "").translate(NOCASE_FOLD), contact_id
+
+    return [contact_id for contact_id, _ in heapq.nsmallest(limit, candidates, key=rank)]
+
+
+# The same ranking for one word, which short prefixes can match in a large
+# share of all contacts: contacts are read a matching term at a time, best
+# term first, and only until limit of them are found
+def best_single_word_matches(conn, terms, valid_tables, limit):
+    sql = name_match_sql(valid_tables, "ORDER BY c.name COLLATE NOCASE, c.id LIMIT ?")
+    best = {}
+    for term, _ in sorted(terms.items(), key=lambda item: item[1], reverse=True):
+        for contact_id, name in conn.execute(sql, (name_match_query([term]), *valid_tables, limit)):
+            # A phrase also matches other spellings of its words
+            if contact_id not in best and term in name_term_words(name):
+                best[contact_id] = None
+                if len(best) >= limit:
+                    return list(best)
+    return list(best)
 
 def get_table_creation_date(conn, table_name):
     try:
@@ -453,5 +2569,402 @@ def get_table_creation_date(conn, table_name):
         result = cursor.fetchone()
         return result[0] if result else None
     except sqlite3.Error as e:
-        print(f'Error fetching creation date for table {table_name}: {e}')
+        report_error(f'Error fetching creation date for table {table_name}: {e}')
         return None
+
+
+# Per-table figures shown on the main window, all gathered in one query
+TableStats = namedtuple("TableStats", "name created_at contacts last_modified photos")
+
+TABLE_STATS_SQL = '''
+    SELECT t.name, t.created_at, COUNT(c.id), MAX(c.last_modified), COUNT(NULLIF(c.photo, ''))
+    FROM tables t LEFT JOIN contacts c ON c.group_id = t.id
+    {where}
+    GROUP BY t.id
+    ORDER BY t.id
+'''
+
+# Cached TableStats by table name. Write paths call invalidate_table_stats
+# with the table they changed, and only those tables are queried again.
+# stale maps each changed table to the number of its latest invalidation,
+# so a write that lands while its table is being read keeps it stale.
+# Any write also drops the cached search results.
+table_stats_cache = {"loaded": False, "generation": 0, "writes": 0, "tables": {}, "stale": {}}
+table_stats_lock = threading.Lock()
+
+
+def invalidate_table_stats(table_name=None):
+    invalidate_search_cache()
+    with table_stats_lock:
+        if table_name is None:
+            table_stats_cache["loaded"] = False
+            table_stats_cache["generation"] += 1
+        else:
+            table_stats_cache["writes"] += 1
+            table_stats_cache["stale"][table_name] = table_stats_cache["writes"]
+
+
+# Name, creation date, contact count, last change and photo count of every
+# table, in table creation order
+def fetch_table_stats(conn):
+    with table_stats_lock:
+        loaded = table_stats_cache["loaded"]
+        generation = table_stats_cache["generation"]
+        stale = dict(table_stats_cache["stale"])
+    try:
+        if not loaded:
+            rows = conn.execute(TABLE_STATS_SQL.format(where="")).fetchall()
+        elif stale:
+            placeholders = ", ".join("?" for _ in stale)
+            rows = conn.execute(
+                TABLE_STATS_SQL.format(where=f"WHERE t.name IN ({placeholders})"),
+                tuple(stale),
+            ).fetchall()
+        else:
+            rows = None
+    except sqlite3.Error as e:
+        report_error(f'Error fetching table statistics: {e}')
+        return []
+
+    with table_stats_lock:
+        tables = table_stats_cache["tables"]
+        if not loaded:
+            tables.clear()
+            # Unless everything was invalidated again while we were reading
+            table_stats_cache["loaded"] = generation == table_stats_cache["generation"]
+        elif rows is not None:
+            # Tables that are gone drop out; changed ones keep their place and
+            # new ones, which have the highest ids, go last
+            found = {row[0] for row in rows}
+            for table_name in stale.keys() - found:
+                tables.pop(table_name, None)
+        # Tables written to again while we were reading stay stale
+        for table_name, changed in stale.items():
+            if table_stats_cache["stale"].get(table_name) == changed:
+                del table_stats_cache["stale"][table_name]
+        for row in rows or ():
+            tables[row[0]] = TableStats(*row)
+        return list(tables.values())
+
+
+# Duplicate detection. Every contact gets a few blocking keys: its phone
+# numbers, its email, and name keys made of the phonetic code of its name
+# and a min-hashed name trigram. Only contacts sharing a key are compared,
+# and keys shared by more than DUPLICATE_MAX_BLOCK contacts are ignored, so
+# each contact is compared with a bounded number of others. Keys live in duplicate_keys
+# and are computed for new or edited contacts (dedupe_indexed = 0) the next
+# time duplicates are looked for.
+DUPLICATE_MIN_SCORE = 0.5
+DUPLICATE_MAX_BLOCK = 50  # keys shared by more contacts say too little to compare them all
+DUPLICATE_NAME_HASHES = 3
+MINHASH_SALTS = (0, 0x5BD1E995, 0x9E3779B1)
+PHONE_COLUMNS = tuple(ENTRY_COLUMNS.index(field) for field in ("phone_contact", "whatsapp_phone", "signal_phone"))
+SOUNDEX_CODES = {
+    letter: digit
+    for digit, letters in enumerate(("aeiouyhw", "bfpv", "cgjkqsxz", "dt", "l", "mn", "r"))
+    for letter in letters
+}
+
+
+def normalize_name(name):
+    name = name or ""
+    if not name.isascii():
+        decomposed = unicodedata.normalize("NFKD", name)
+        name = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(re.findall(r"\w+", name.casefold()))
+
+
+def name_trigrams(name):
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# Soundex code of a word of plain letters, "" for anything else. Cached,
+# since the same first and last names come up again and again.
+@lru_cache(maxsize=65536)
+def soundex(word):
+    letters = [ch for ch in word.lower() if ch in SOUNDEX_CODES]
+    if not letters or len(letters) < len(word):
+        return ""
+    code = letters[0].upper()
+    last = SOUNDEX_CODES[letters[0]]
+    for letter in letters[1:]:
+        digit = SOUNDEX_CODES[letter]
+        if digit and digit != last:
+            code += str(digit)
+            if len(code) == 4:
+                break
+        if letter not in "hw":
+            last = digit
+    return code.ljust(4, "0")
+
+
+# Phonetic code of a normalized name: the Soundex codes of its first and
+# last word, in either order
+def name_code(name):
+    words = name.split()
+    if not words:
+        return ""
+    return "-".join(sorted({soundex(words[0]), soundex(words[-1])} - {""}))
+
+
+# Phone numbers compared by their last digits, so the same number with and
+# without a country code matches
+def contact_phones(row):
+    phones = set()
+    for index in PHONE_COLUMNS:
+        digits = re.sub(r"\D", "", row[index] or "")
+        if len(digits) >= PHONE_TAIL_MIN_DIGITS:
+            phones.add(digits[-PHONE_TAIL_DIGITS:])
+    return phones
+
+
+def contact_email(row):
+    email = (row[3] or "").strip().casefold()
+    return email if "@" in email else ""
+
+
+# Blocking keys of a row laid out as ENTRY_COLUMNS
+def duplicate_keys(row):
+    keys = {f"p:{phone}" for phone in contact_phones(row)}
+    email = contact_email(row)
+    if email:
+        keys.add(f"e:{email}")
+    name = normalize_name(row[1])
+    if name:
+        keys.update(name_keys(name))
+    return keys
+
+
+# Without a shared phone or email, two contacts only score high enough when
+# their names sound alike and share most trigrams, so each name key pairs the
+# phonetic code with one min-hashed trigram
+@lru_cache(maxsize=65536)
+def name_keys(name):
+    code = name_code(name)
+    hashed = {zlib.crc32(gram.encode()): gram for gram in name_trigrams(name)}
+    keys = []
+    for seed in range(DUPLICATE_NAME_HASHES):
+        salt = MINHASH_SALTS[seed]
+        trigram = hashed[min(map(salt.__xor__, hashed)) ^ salt]
+        keys.append(f"n{seed}:{code}:{trigram}")
+    return tuple(keys)
+
+
+# What contacts are compared on: name trigrams, phonetic name code, phone
+# numbers and email
+def contact_profile(row):
+    name = normalize_name(row[1])
+    return name_trigrams(name), name_code(name), contact_phones(row), contact_email(row)
+
+
+# How likely two contacts are the same person, from 0 to 1, given their
+# profiles: mostly name similarity, raised by names that sound alike and by
+# a shared phone number or email
+def contact_similarity(a, b):
+    trigrams_a, code_a, phones_a, email_a = a
+    trigrams_b, code_b, phones_b, email_b = b
+    shared = len(trigrams_a & trigrams_b)
+    score = 0.5 * shared / (len(trigrams_a) + len(trigrams_b) - shared)
+    if code_a and code_a == code_b:
+        score += 0.2
+    if phones_a & phones_b:
+        score += 0.3
+    if email_a and email_a == email_b:
+        score += 0.3
+    return min(score, 1.0)
+
+
+# Compute the blocking keys of contacts added or edited since the last run.
+# Returns the ids of those contacts.
+def index_duplicate_keys(conn, chunk_size=1000):
+    indexed = []
+    select_sql = f'''
+    SELECT {ENTRY_SELECT} FROM contacts c
+    WHERE c.dedupe_indexed = 0 AND c.id > ? ORDER BY c.id LIMIT ?
+    '''
+    after = 0
+    with conn:
+        while True:
+            rows = conn.execute(select_sql, (after, chunk_size)).fetchall()
+            if not rows:
+                return indexed
+            after = rows[-1][0]
+            ids = [row[0] for row in rows]
+            # In key order, so the inserts walk the index instead of jumping around it
+            conn.executemany(
+                'INSERT OR IGNORE INTO duplicate_keys (key, contact_id) VALUES (?, ?)',
+                sorted((key, row[0]) for row in rows for key in duplicate_keys(row)),
+            )
+            conn.execute(
+                'UPDATE contacts SET dedupe_indexed = 1 WHERE id IN (SELECT value FROM json_each(?))',
+                (json.dumps(ids),),
+            )
+            indexed.extend(ids)
+
+
+# Pairs of contacts sharing a blocking key, optionally only pairs involving
+# one of contact_ids
+def duplicate_candidates(conn, contact_ids=None):
+    params = {"max_block": DUPLICATE_MAX_BLOCK}
+    if contact_ids is None:
+        cursor = conn.execute('''
+            WITH blocks AS (
+                SELECT key FROM duplicate_keys GROUP BY key HAVING COUNT(*) BETWEEN 2 AND :max_block
+            )
+            SELECT DISTINCT a.contact_id, b.contact_id
+            FROM blocks
+            JOIN duplicate_keys a ON a.key = blocks.key
+            JOIN duplicate_keys b ON b.key = blocks.key AND b.contact_id > a.contact_id
+        ''', params)
+        return set(cursor)
+    else:
+        cursor = conn.execute('''
+            SELECT DISTINCT a.contact_id, b.contact_id
+            FROM duplicate_keys a
+            JOIN duplicate_keys b ON b.key = a.key AND b.contact_id != a.contact_id
+            WHERE a.contact_id IN (SELECT value FROM json_each(:ids))
+            AND (SELECT COUNT(*) FROM duplicate_keys k WHERE k.key = a.key) <= :max_block
+        ''', {**params, "ids": json.dumps(list(contact_ids))})
+    return {tuple(sorted(pair)) for pair in cursor}
+
+
+# Groups of contacts that are likely the same person. Each cluster is a
+# list of result rows (RESULT_SELECT) ordered by id; clusters with the
+# most contacts come first. With contact_ids only clusters involving those
+# contacts are returned, so new or edited contacts can be checked without
+# rescanning the whole database. Needs a writable connection.
+def find_duplicates(conn, table_names=None, contact_ids=None, min_score=DUPLICATE_MIN_SCORE):
+    try:
+        index_duplicate_keys(conn)
+        pairs = duplicate_candidates(conn, contact_ids)
+        ids = {contact_id for pair in pairs for contact_id in pair}
+        sql = f'''
+        SELECT {RESULT_SELECT} FROM contacts c JOIN tables t ON t.id = c.group_id
+        WHERE c.id IN (SELECT value FROM json_each(?))
+        '''
+        rows = {row[0]: row for row in conn.execute(sql, (json.dumps(list(ids)),))}
+    except sqlite3.Error as e:
+        report_error(f'Error finding duplicates: {e}')
+        return []
+
+    if table_names is not None:
+        rows = {contact_id: row for contact_id, row in rows.items() if row[-1] in table_names}
+
+    # Union-find over the pairs that score high enough
+    profiles = {contact_id: contact_profile(row) for contact_id, row in rows.items()}
+    parent = {}
+
+    def root(contact_id):
+        while parent.get(contact_id, contact_id) != contact_id:
+            contact_id = parent[contact_id]
+        return contact_id
+
+    for a, b in pairs:
+        if a in profiles and b in profiles and contact_similarity(profiles[a], profiles[b]) >= min_score:
+            root_a, root_b = root(a), root(b)
+            if root_a != root_b:
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    clusters = {}
+    for contact_id in parent:
+        clusters.setdefault(root(contact_id), []).append(contact_id)
+    for contact_id in list(clusters):
+        clusters[contact_id].append(contact_id)
+    return sorted(
+        ([rows[contact_id] for contact_id in sorted(members)] for members in clusters.values()),
+        key=lambda cluster: (-len(cluster), cluster[0][0]),
+    )
+
+
+# Duplicates involving contacts added or edited since duplicate keys were
+# last computed
+def find_new_duplicates(conn, table_names=None, min_score=DUPLICATE_MIN_SCORE):
+    try:
+        new_ids = index_duplicate_keys(conn)
+    except sqlite3.Error as e:
+        report_error(f'Error finding duplicates: {e}')
+        return []
+    if not new_ids:
+        return []
+    return find_duplicates(conn, table_names, new_ids, min_score)
+
+
+# Merge contacts into keep_id: empty fields of the kept contact are filled
+# from the others, differing notes are appended, and the others are deleted
+def merge_contacts(conn, keep_id, merge_ids):
+    merge_ids = [contact_id for contact_id in merge_ids if contact_id != keep_id]
+    notes = CONTACT_FIELDS.index("other_notes")
+    select_sql = f'SELECT id, {", ".join(CONTACT_FIELDS)} FROM contacts WHERE id IN (SELECT value FROM json_each(?))'
+    update_sql = f'''
+    UPDATE contacts SET {", ".join(f"{field} = ?" for field in CONTACT_FIELDS + tuple(LOOKUP_FIELDS))},
+        last_modified = CURRENT_TIMESTAMP
+    WHERE id = ?
+    '''
+    try:
+        with conn:
+            rows = {row[0]: row[1:] for row in conn.execute(select_sql, (json.dumps([keep_id, *merge_ids]),))}
+            if keep_id not in rows:
+                report_error(f'Contact {keep_id} does not exist.')
+                return False
+            merged = list(rows[keep_id])
+            for contact_id in merge_ids:
+                for index, value in enumerate(rows.get(contact_id, ())):
+                    if not value:
+                        continue
+                    if not merged[index]:
+                        merged[index] = value
+                    elif index == notes and value not in merged[index]:
+                        merged[index] = f"{merged[index]}\n{value}"
+            conn.execute(update_sql, (*merged, *lookup_values(merged), keep_id))
+            conn.execute(
+                'DELETE FROM contacts WHERE id IN (SELECT value FROM json_each(?))',
+                (json.dumps(merge_ids),),
+            )
+        invalidate_table_stats()
+        report(f'Merged {len(merge_ids)} contacts into contact {keep_id}.')
+        return True
+    except sqlite3.Error as e:
+        report_error(f'Error merging contacts: {e}')
+        return False
+
+
+# Contacts in any of table_names (all tables by default) that own a phone
+# number, as a phone, WhatsApp or Signal number, however it was written.
+# Without an exact match, numbers ending in the same PHONE_TAIL_DIGITS
+# digits match, so a number with a country code finds one stored without.
+def lookup_by_phone(conn, phone, table_names=None):
+    number = normalize_phone(phone)
+    if number is None:
+        return []
+    condition = " OR ".join(f"c.{column} = :value" for column in PHONE_LOOKUP_FIELDS)
+    rows = lookup_contacts(conn, f"({condition})", number, table_names)
+    digits = number.lstrip("+")
+    if rows or len(digits) < PHONE_TAIL_MIN_DIGITS:
+        return rows
+    condition = " OR ".join(f"{phone_tail_sql(f'c.{column}')} = :value" for column in PHONE_LOOKUP_FIELDS)
+    return lookup_contacts(conn, f"({condition})", digits[-PHONE_TAIL_DIGITS:], table_names)
+
+
+def lookup_by_email(conn, email, table_names=None):
+    address = normalize_email(email)
+    if address is None:
+        return []
+    return lookup_contacts(conn, "c.email_norm = :value", address, table_names)
+
+
+def lookup_contacts(conn, condition, value, table_names):
+    params = {"value": value}
+    sql = f'SELECT {RESULT_SELECT} FROM contacts c JOIN tables t ON t.id = c.group_id WHERE {condition}'
+    if table_names is not None:
+        names = {f"table{index}": name for index, name in enumerate(table_names)}
+        if not names:
+            return []
+        sql += f' AND t.name IN ({", ".join(f":{key}" for key in names)})'
+        params.update(names)
+    sql += f' ORDER BY {", ".join(COMBINE_ORDER)}'
+    try:
+        return conn.execute(sql, params).fetchall()
+    except sqlite3.Error as e:
+        report_error(f'Error looking up contacts: {e}')
+        return []
@@ -0,0 +1,266 @@
+# Command-line interface to the contacts database, for scripted and
+# headless use:
+#
+#     python -m cli tables
+#     python -m cli import-csv friends contacts.csv --map relationship=Labels
+#     python -m cli search alice --type all --format csv
+#
+# Only backend.py is imported, never PyQt5. Results go to stdout as they are
+# read from the database; the backend's own messages go to stderr.
+import argparse
+import contextlib
+import csv
+import json
+import os
+import sys
+
+import backend as db_ops
+
+RESULT_COLUMNS = db_ops.ENTRY_COLUMNS + ("source_table",)
+TABLE_COLUMNS = db_ops.TableStats._fields
+OUTPUT_FORMATS = ("jsonl", "json", "csv")
+
+
+class CommandError(Exception):
+    pass
+
+
+# Write rows as they come: one JSON object per line, a JSON array, or CSV
+# with a header row
+def write_rows(rows, columns, output_format, out):
+    count = 0
+    if output_format == "csv":
+        writer = csv.writer(out)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    elif output_format == "json":
+        out.write("[")
+        for row in rows:
+            out.write(",\n" if count else "\n")
+            out.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+            count += 1
+        out.write("\n]\n" if count else "]\n")
+    else:
+        for row in rows:
+            out.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+            out.write("\n")
+            count += 1
+    return count
+
+
+def write_result(result, out):
+    out.write(json.dumps(result, ensure_ascii=False))
+    out.write("\n")
+
+
+def all_table_names(conn):
+    return [table[1] for table in db_ops.fetch_all_tables(conn)]
+
+
+# Progress callback that keeps the latest counts and reports them on
+# stderr when asked to
+def import_progress(args, counts):
+    def report(latest):
+        counts.update(latest)
+        if args.progress:
+            print(
+                f"Read {latest['read']} rows, imported {latest['imported']} contacts, "
+                f"{latest['unchanged']} unchanged, photos {latest['photos_done']} of {latest['photos_total']}"
+            )
+    return report
+
+
+def list_tables(conn, args, out):
+    write_rows(db_ops.fetch_table_stats(conn), TABLE_COLUMNS, args.format, out)
+
+
+def create_table(conn, args, out):
+    if not db_ops.add_table_metadata(conn, args.table):
+        raise CommandError(f'Could not create table "{args.table}": invalid name or it already exists.')
+    write_result({"created": args.table}, out)
+
+
+def delete_table(conn, args, out):
+    if args.table not in all_table_names(conn):
+        raise CommandError(f'Table "{args.table}" does not exist.')
+    if not db_ops.delete_table(conn, args.table):
+        raise CommandError(f'Could not delete table "{args.table}".')
+    write_result({"deleted": args.table}, out)
+
+
+def import_csv(conn, args, out):
+    try:
+        with open(args.file, newline="", encoding="utf-8-sig") as csv_file:
+            headers = csv.DictReader(csv_file).fieldnames or []
+    except (OSError, csv.Error) as e:
+        raise CommandError(f"Could not read CSV: {e}")
+
+    mapping = db_ops.suggest_csv_mapping(headers)
+    for item in args.map:
+        field, separator, column = item.partition("=")
+        if not separator or field not in mapping:
+            raise CommandError(f'Invalid mapping "{item}"; use FIELD=COLUMN with a field from: {", ".join(mapping)}')
+        mapping[field] = column
+    if not (mapping.get("name") or mapping.get("name_2")):
+        raise CommandError("No name column found; map one with --map name=COLUMN.")
+
+    counts = {"unchanged": 0}
+    imported, skipped, error = db_ops.import_google_contacts(
+        conn, args.table, args.file, mapping, progress=import_progress(args, counts), update=not args.append
+    )
+    if error:
+        raise CommandError(error)
+    write_result({"imported": imported, "unchanged": counts["unchanged"], "skipped": skipped}, out)
+
+
+def import_vcard(conn, args, out):
+    counts = {"unchanged": 0}
+    imported, skipped, error = db_ops.import_vcards(
+        conn, args.table, args.file, progress=import_progress(args, counts), update=not args.append
+    )
+    if error:
+        raise CommandError(error)
+    write_result({"imported": imported, "unchanged": counts["unchanged"], "skipped": skipped}, out)
+
+
+def search(conn, args, out):
+    table_names = args.tables or all_table_names(conn)
+    rows = db_ops.iter_search_tables(conn, args.term, table_names, args.type)
+    write_rows(rows, RESULT_COLUMNS, args.format, out)
+
+
+def combine(conn, args, out):
+    if len(args.tables) < 2:
+        raise CommandError("Select at least two tables to combine.")
+    rows = db_ops.iter_combined_tables(conn, args.tables, dedupe=args.dedupe)
+    write_rows(rows, RESULT_COLUMNS, args.format, out)
+
+
+def export(conn, args, out):
+    if args.table not in all_table_names(conn):
+        raise CommandError(f'Table "{args.table}" does not exist.')
+    if args.format in ("vcard", "vcard4"):
+        if not args.output:
+            raise CommandError("vCard export needs --output.")
+        version = "4.0" if args.format == "vcard4" else "3.0"
+        exported, error = db_ops.export_vcards(conn, args.table, args.output, version)
+        if error:
+            raise CommandError(error)
+        write_result({"exported": exported, "file": args.output}, out)
+        return
+
+    rows = db_ops.iter_entries(conn, args.table)
+    if not args.output:
+        write_rows(rows, db_ops.ENTRY_COLUMNS, args.format, out)
+        return
+    try:
+        with open(args.output, "w", newline="", encoding="utf-8") as output_file:
+            exported = write_rows(rows, db_ops.ENTRY_COLUMNS, args.format, output_file)
+    except OSError as e:
+        raise CommandError(f"Could not write {args.output}: {e}")
+    write_result({"exported": exported, "file": args.output}, out)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m cli", description="Manage the Connections contacts database.")
+    parser.add_argument("-q", "--quiet", action="store_true", help="hide backend messages on stderr")
+    parser.add_argument(
+        "--data-dir",
+        help=f"directory holding the database, or {db_ops.MEMORY_STORE} for a throwaway in-memory store "
+        f"(default: ${db_ops.DATA_DIR_ENV} or the user data directory)",
+    )
+    parser.add_argument("--photos-dir", help=f"directory for photos, kept in its cache/ subdirectory (default: ${db_ops.PHOTOS_DIR_ENV} or DATA_DIR/photos)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_format(command, choices=OUTPUT_FORMATS):
+        command.add_argument("-f", "--format", choices=choices, default="jsonl", help="output format (default: jsonl)")
+
+    command = commands.add_parser("tables", help="list tables with their statistics")
+    add_format(command)
+    command.set_defaults(handler=list_tables)
+
+    command = commands.add_parser("create-table", help="create a table")
+    command.add_argument("table")
+    command.set_defaults(handler=create_table)
+
+    command = commands.add_parser("delete-table", help="delete a table and its contacts")
+    command.add_argument("table")
+    command.set_defaults(handler=delete_table)
+
+    command = commands.add_parser("import-csv", help="import a Google Contacts CSV export")
+    command.add_argument("table")
+    command.add_argument("file")
+    command.add_argument(
+        "--map", action="append", default=[], metavar="FIELD=COLUMN",
+        help="map a CSV column to a field, overriding the suggested mapping (repeatable)",
+    )
+    command.add_argument("--progress", action="store_true", help="report progress on stderr")
+    command.add_argument(
+        "--append", action="store_true",
+        help="add every contact as new instead of updating contacts imported earlier from the same source",
+    )
+    command.set_defaults(handler=import_csv)
+
+    command = commands.add_parser("import-vcard", help="import a vCard (.vcf) file")
+    command.add_argument("table")
+    command.add_argument("file")
+    command.add_argument("--progress", action="store_true", help="report progress on stderr")
+    command.add_argument(
+        "--append", action="store_true",
+        help="add every contact as new instead of updating contacts imported earlier from the same source",
+    )
+    command.set_defaults(handler=import_vcard)
+
+    command = commands.add_parser("search", help="search contacts")
+    command.add_argument("term")
+    command.add_argument("-t", "--tables", nargs="+", help="tables to search (default: all)")
+    command.add_argument(
+        "--type", choices=("name", "relationship", "all", "fuzzy"), default="name",
+        help="fields to search; fuzzy ranks names allowing typos",
+    )
+    add_format(command)
+    command.set_defaults(handler=search)
+
+    command = commands.add_parser("combine", help="combine tables, ordered by name")
+    command.add_argument("tables", nargs="+")
+    command.add_argument("--dedupe", action="store_true", help="show contacts found in several tables once")
+    add_format(command)
+    command.set_defaults(handler=combine)
+
+    command = commands.add_parser("export", help="export a table")
+    command.add_argument("table")
+    command.add_argument("-o", "--output", help="file to write (default: stdout)")
+    add_format(command, OUTPUT_FORMATS + ("vcard", "vcard4"))
+    command.set_defaults(handler=export)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    out = sys.stdout
+    # The backend reports with print(); keep stdout for results only
+    messages = open(os.devnull, "w") if args.quiet else sys.stderr
+    try:
+        with contextlib.redirect_stdout(messages):
+            conn = db_ops.open_store(args.data_dir, args.photos_dir)
+            if conn is None:
+                raise CommandError("Could not open the database.")
+            args.handler(conn, args, out)
+    except CommandError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    except BrokenPipeError:
+        # Output piped into head and the like; drop what is still buffered
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    finally:
+        if args.quiet:
+            messages.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
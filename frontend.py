@@ -1,15 +1,25 @@
 import sys
+import argparse
 import csv
-from PyQt5.QtWidgets import QComboBox, QHBoxLayout,QHeaderView,QSizePolicy, QApplication, QMainWindow, QWidget, QVBoxLayout, QPushButton,QGridLayout, QLineEdit, QLabel, QTableWidget, QTableWidgetItem, QCheckBox, QFormLayout, QMessageBox, QInputDialog,QScrollArea, QDialog, QFileDialog
-from PyQt5.QtCore import Qt
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from PyQt5.QtWidgets import QComboBox, QHBoxLayout,QHeaderView,QSizePolicy, QApplication, QMainWindow, QWidget, QVBoxLayout, QPushButton,QGridLayout, QLineEdit, QLabel, QTableWidget, QTableWidgetItem, QCheckBox, QListWidget, QFormLayout, QMessageBox, QInputDialog,QScrollArea, QDialog, QFileDialog, QTableView, QAbstractItemView, QStyledItemDelegate, QStyleOptionButton, QStyle, QProgressDialog
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QEvent, QRect, QSize, pyqtSignal, QObject, QRunnable, QThreadPool, QTimer
 import backend as db_ops
-from PyQt5.QtGui import QIcon, QPixmap, QPainter, QColor
+from PyQt5.QtGui import QIcon, QPixmap, QPainter, QColor, QImageReader
 import os
 
 PHOTO_SIZE = 64
 PLACEHOLDER_BG = QColor(230, 230, 230)
 PLACEHOLDER_FG = QColor(190, 190, 190)
 _PLACEHOLDER_CACHE = {}
+PIXMAP_CACHE_SIZE = 1024
+_PIXMAP_CACHE = OrderedDict()
+_PHOTO_LOADER = None
+FETCH_BATCH_SIZE = 200
+SEARCH_DELAY_MS = 250
 
 
 def resource_path(rel_path):
@@ -42,28 +52,480 @@ def placeholder_pixmap(size=PHOTO_SIZE):
     return pixmap
 
 
-def build_photo_label(photo_path, size=PHOTO_SIZE):
-    label = QLabel()
-    label.setFixedSize(size, size)
-    label.setAlignment(Qt.AlignCenter)
-    if photo_path and os.path.isfile(photo_path):
-        pixmap = QPixmap(photo_path)
-        if not pixmap.isNull():
-            pixmap = pixmap.scaled(size, size, Qt.KeepAspectRatioByExpanding, Qt.SmoothTransformation)
-            label.setPixmap(pixmap)
-            return label
-    label.setPixmap(placeholder_pixmap(size))
-    return label
+def thumbnail_file(photo_path, mtime_ns, size):
+    key = f"{os.path.abspath(photo_path)}|{mtime_ns}|{size}"
+    name = hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+    return db_ops.get_thumbnails_dir() / f"{name}.png"
+
+
+# Photos are cached scaled to the size they are shown at, keyed by path and
+# mtime so an edited file gets a new thumbnail
+def photo_key(photo_path, size=PHOTO_SIZE):
+    try:
+        mtime_ns = os.stat(photo_path).st_mtime_ns
+    except OSError:
+        return None
+    return (photo_path, mtime_ns, size)
+
+
+# Decodes a photo straight to its display size: QImageReader only produces
+# the scaled pixels (JPEG decodes at a fraction of its resolution), so large
+# photos are never decoded in full. Scaled copies are written to the thumbnails
+# directory so later runs only read PHOTO_SIZE images. Only uses QImage, so it
+# is safe off the GUI thread.
+def decode_photo(photo_path, mtime_ns, size):
+    thumbnail = thumbnail_file(photo_path, mtime_ns, size)
+    if thumbnail.is_file():
+        image = QImageReader(str(thumbnail)).read()
+        if not image.isNull():
+            return image
+
+    reader = QImageReader(photo_path)
+    reader.setAutoTransform(True)
+    scaled_size = reader.size()
+    if scaled_size.isValid():
+        scaled_size.scale(size, size, Qt.KeepAspectRatioByExpanding)
+        reader.setScaledSize(scaled_size)
+    image = reader.read()
+    if image.isNull():
+        return image
+    if not image.save(str(thumbnail), "PNG"):
+        print(f'Error saving thumbnail "{thumbnail}"')
+    return image
+
+
+# Decoded pixmaps are kept in a small LRU; photos that could not be decoded
+# are kept as null pixmaps so they are not tried again
+def cached_photo(key):
+    pixmap = _PIXMAP_CACHE.get(key)
+    if pixmap is not None:
+        _PIXMAP_CACHE.move_to_end(key)
+    return pixmap
+
+
+def cache_photo(key, image):
+    pixmap = QPixmap.fromImage(image)
+    _PIXMAP_CACHE[key] = pixmap
+    if len(_PIXMAP_CACHE) > PIXMAP_CACHE_SIZE:
+        _PIXMAP_CACHE.popitem(last=False)
+    return pixmap
+
+
+class PhotoJobSignals(QObject):
+    finished = pyqtSignal(object, object)
+
+
+class PhotoJob(QRunnable):
+    def __init__(self, key):
+        super().__init__()
+        self.key = key
+        self.views = set()
+        self.cancelled = False
+        self.signals = PhotoJobSignals()
+
+    def run(self):
+        if self.cancelled:
+            return
+        self.signals.finished.emit(self.key, decode_photo(*self.key))
 
 
+# Decodes photos for the contact grids on a thread pool of its own, so
+# showing a table never waits for images and photo decodes never hold up
+# backend workers. request() returns the cached pixmap, or starts a decode
+# and returns None; loaded is emitted once the pixmap is in the cache.
+class PhotoLoader(QObject):
+    loaded = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.jobs = {}
+
+    def request(self, key, view):
+        pixmap = cached_photo(key)
+        if pixmap is not None:
+            return pixmap
+        job = self.jobs.get(key)
+        if job is None:
+            job = PhotoJob(key)
+            job.signals.finished.connect(self.job_finished)
+            self.jobs[key] = job
+            self.pool.start(job)
+        job.views.add(view)
+        return None
+
+    # Forget view's requests for photos other than visible_paths. Decodes no
+    # view is waiting for any more are skipped if they have not started.
+    def keep_only(self, view, visible_paths=()):
+        for key, job in list(self.jobs.items()):
+            if view in job.views and key[0] not in visible_paths:
+                job.views.discard(view)
+                if not job.views:
+                    job.cancelled = True
+                    del self.jobs[key]
+
+    def job_finished(self, key, image):
+        self.jobs.pop(key, None)
+        cache_photo(key, image)
+        self.loaded.emit(key)
+
+
+def photo_loader():
+    global _PHOTO_LOADER
+    if _PHOTO_LOADER is None:
+        _PHOTO_LOADER = PhotoLoader(QApplication.instance())
+    return _PHOTO_LOADER
+
+
+class WorkerSignals(QObject):
+    rows = pyqtSignal(list)
+    progress = pyqtSignal(dict)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+
+# Runs job(conn, worker) on the global thread pool with a database
+# connection checked out of the backend pool, so long backend calls never block the GUI
+# thread. Jobs get a read-only connection unless read_only is False. Jobs
+# send partial results through emit_rows and progress through
+# signals.progress, and should stop once worker.cancelled is set; cancel()
+# also interrupts the query in flight unless interrupt is False. Errors
+# raised after cancelling (such as the interrupt itself) are not reported.
+class BackendWorker(QRunnable):
+    def __init__(self, job, interrupt=True, read_only=True):
+        super().__init__()
+        self.job = job
+        self.interrupt = interrupt
+        self.read_only = read_only
+        self.signals = WorkerSignals()
+        self.cancelled = False
+        self.conn = None
+        self.conn_lock = threading.Lock()
+
+    def cancel(self):
+        self.cancelled = True
+        with self.conn_lock:
+            if self.interrupt and self.conn is not None:
+                self.conn.interrupt()
+
+    def emit_rows(self, rows, batch_size=FETCH_BATCH_SIZE):
+        batch = []
+        for row in rows:
+            if self.cancelled:
+                return
+            batch.append(row)
+            if len(batch) >= batch_size:
+                self.signals.rows.emit(batch)
+                batch = []
+        if batch and not self.cancelled:
+            self.signals.rows.emit(batch)
+
+    def run(self):
+        conn = db_ops.acquire_connection(self.read_only)
+        if conn is None:
+            self.signals.failed.emit("Could not open the database.")
+            return
+        with self.conn_lock:
+            self.conn = conn
+        try:
+            if not self.cancelled:
+                result = self.job(conn, self)
+            else:
+                result = None
+        except Exception as e:
+            if not self.cancelled:
+                self.signals.failed.emit(str(e))
+        else:
+            self.signals.finished.emit(result)
+        finally:
+            with self.conn_lock:
+                self.conn = None
+            # Nothing may escape run(): PyQt aborts on exceptions from a QRunnable
+            try:
+                db_ops.release_connection(conn)
+            except sqlite3.Error as e:
+                if not self.cancelled:
+                    self.signals.failed.emit(f"Could not release the database connection: {e}")
+
+
+def start_worker(job, on_finished=None, on_rows=None, on_progress=None, on_failed=None, interrupt=True, read_only=True):
+    worker = BackendWorker(job, interrupt, read_only)
+    if on_finished is not None:
+        worker.signals.finished.connect(on_finished)
+    if on_rows is not None:
+        worker.signals.rows.connect(on_rows)
+    if on_progress is not None:
+        worker.signals.progress.connect(on_progress)
+    if on_failed is not None:
+        worker.signals.failed.connect(on_failed)
+    QThreadPool.globalInstance().start(worker)
+    return worker
+
+
+# Columns of the contact grids: (header, index into an entry row). Entry rows
+# follow backend.ENTRY_COLUMNS; combined and search results add the source table.
+CONTACT_VIEW_COLUMNS = [
+    ("Photo", 9),
+    ("Name", 1),
+    ("Phone", 2),
+    ("Email", 3),
+    ("WhatsApp", 4),
+    ("Signal", 5),
+    ("Telegram", 6),
+    ("Facebook", 7),
+    ("LinkedIn", 8),
+    ("Relationship", 10),
+    ("Notes", 11),
+]
+RESULT_VIEW_COLUMNS = CONTACT_VIEW_COLUMNS + [("Last Modified", 13), ("Source Table", 14)]
+PHOTO_PATH_ROLE = Qt.UserRole + 1
+
+
+# Table model over contact rows. Rows arrive either from an iterator pulled
+# in batches as the view scrolls, from a page source whose pages are fetched
+# by a background worker, or pushed in with append_rows by a streaming
+# worker. Only what has been shown is held here, and nothing is created per
+# cell.
+class ContactsModel(QAbstractTableModel):
+    def __init__(self, columns, actions=(), parent=None):
+        super().__init__(parent)
+        self.columns = columns
+        self.actions = list(actions)
+        self.rows = []
+        self.source = iter(())
+        self.fetch_page = None
+        self.next_key = None
+        self.page_worker = None
+        self.exhausted = True
+
+    def reset(self):
+        if self.page_worker is not None:
+            self.page_worker.cancel()
+            self.page_worker = None
+        self.beginResetModel()
+        self.rows = []
+        self.source = iter(())
+        self.fetch_page = None
+        self.next_key = None
+        self.exhausted = True
+        self.endResetModel()
+
+    def set_rows(self, rows):
+        self.reset()
+        self.source = iter(rows)
+        self.exhausted = False
+        if self.canFetchMore(QModelIndex()):
+            self.fetchMore(QModelIndex())
+
+    # fetch_page(conn, after_key, limit) -> (rows, next_key), run off the GUI thread
+    def set_page_source(self, fetch_page):
+        self.reset()
+        self.fetch_page = fetch_page
+        self.exhausted = False
+        self.fetchMore(QModelIndex())
+
+    def append_rows(self, rows):
+        if not rows:
+            return
+        first = len(self.rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self.rows.extend(rows)
+        self.endInsertRows()
+
+    def entry(self, row):
+        return self.rows[row]
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns) + len(self.actions)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.exhausted:
+            return
+        if self.fetch_page is not None:
+            self.fetch_next_page()
+            return
+        batch = []
+        for entry in self.source:
+            batch.append(entry)
+            if len(batch) >= FETCH_BATCH_SIZE:
+                break
+        else:
+            self.exhausted = True
+        self.append_rows(batch)
+
+    def fetch_next_page(self):
+        if self.page_worker is not None:
+            return
+        fetch_page = self.fetch_page
+        after_key = self.next_key
+        worker = start_worker(
+            lambda conn, worker: fetch_page(conn, after_key, FETCH_BATCH_SIZE),
+            on_finished=lambda page: self.page_loaded(worker, page),
+            on_failed=lambda error: self.page_loaded(worker, ([], None)),
+        )
+        self.page_worker = worker
+
+    def page_loaded(self, worker, page):
+        if worker is not self.page_worker:
+            return
+        self.page_worker = None
+        rows, self.next_key = page
+        self.exhausted = self.next_key is None
+        self.append_rows(rows)
+
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or orientation != Qt.Horizontal:
+            return None
+        if section < len(self.columns):
+            return self.columns[section][0]
+        return self.actions[section - len(self.columns)]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.column() >= len(self.columns):
+            return None
+        entry = self.rows[index.row()]
+        value = entry[self.columns[index.column()][1]]
+        if index.column() == 0:
+            return value if role == PHOTO_PATH_ROLE else None
+        if role in (Qt.DisplayRole, Qt.ToolTipRole):
+            return "" if value is None else str(value)
+        return None
+
+    def flags(self, index):
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+
+# Paints the contact photo straight from the pixmap cache. Photos not decoded
+# yet are requested from the photo loader and shown as the placeholder until
+# the view repaints.
+class PhotoDelegate(QStyledItemDelegate):
+    def paint(self, painter, option, index):
+        photo_path = index.data(PHOTO_PATH_ROLE)
+        key = photo_key(photo_path) if photo_path else None
+        pixmap = photo_loader().request(key, self.parent()) if key is not None else None
+        if pixmap is None or pixmap.isNull():
+            pixmap = placeholder_pixmap()
+        target = QRect(0, 0, PHOTO_SIZE, PHOTO_SIZE)
+        target.moveCenter(option.rect.center())
+        source = QRect(0, 0, PHOTO_SIZE, PHOTO_SIZE)
+        source.moveCenter(pixmap.rect().center())
+        painter.drawPixmap(target, pixmap, source)
+
+    def sizeHint(self, option, index):
+        return QSize(PHOTO_SIZE, PHOTO_SIZE)
+
+
+# Paints a push button in every cell of its column and reports clicks by row
+class ButtonDelegate(QStyledItemDelegate):
+    clicked = pyqtSignal(int)
+
+    def __init__(self, text, parent=None):
+        super().__init__(parent)
+        self.text = text
+
+    def button_rect(self, option):
+        return option.rect.adjusted(4, (option.rect.height() - 30) // 2, -4, -(option.rect.height() - 30) // 2)
+
+    def paint(self, painter, option, index):
+        button = QStyleOptionButton()
+        button.rect = self.button_rect(option)
+        button.text = self.text
+        button.state = QStyle.State_Enabled | QStyle.State_Raised
+        QApplication.style().drawControl(QStyle.CE_PushButton, button, painter)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+            if self.button_rect(option).contains(event.pos()):
+                self.clicked.emit(index.row())
+            return True
+        return event.type() in (QEvent.MouseButtonPress, QEvent.MouseButtonDblClick)
+
+
+# Read-only grid of contacts shared by the table, combine and search dialogs.
+# actions adds one button column per label; connect to action_delegate(label).clicked.
+class ContactsView(QTableView):
+    def __init__(self, columns, actions=(), parent=None):
+        super().__init__(parent)
+        self.contacts_model = ContactsModel(columns, actions, self)
+        self.setModel(self.contacts_model)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        self.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.setWordWrap(True)
+
+        self.setItemDelegateForColumn(0, PhotoDelegate(self))
+        self.action_delegates = {}
+        for offset, label in enumerate(actions):
+            delegate = ButtonDelegate(label, self)
+            self.setItemDelegateForColumn(len(columns) + offset, delegate)
+            self.action_delegates[label] = delegate
+
+        header = self.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.Stretch)
+        header.setSectionResizeMode(0, QHeaderView.Fixed)
+        self.setColumnWidth(0, PHOTO_SIZE)
+        # Fixed row height: per-row content sizing would touch every row
+        self.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.verticalHeader().setDefaultSectionSize(PHOTO_SIZE)
+
+        photo_loader().loaded.connect(self.photo_loaded)
+        self.verticalScrollBar().valueChanged.connect(self.cancel_hidden_photos)
+        self.contacts_model.modelReset.connect(self.cancel_hidden_photos)
+
+    def photo_loaded(self, key):
+        self.viewport().update()
+
+    # Photos of rows scrolled out of view are not decoded
+    def cancel_hidden_photos(self):
+        model = self.contacts_model
+        first = self.rowAt(0)
+        last = self.rowAt(self.viewport().height() - 1)
+        if last < 0:
+            last = model.rowCount() - 1
+        visible_paths = set()
+        if first >= 0:
+            for row in range(first, last + 1):
+                photo_path = model.index(row, 0).data(PHOTO_PATH_ROLE)
+                if photo_path:
+                    visible_paths.add(photo_path)
+        photo_loader().keep_only(self, visible_paths)
+
+    def action_delegate(self, label):
+        return self.action_delegates[label]
+
+    def set_rows(self, rows):
+        self.contacts_model.set_rows(rows)
+
+    def set_page_source(self, fetch_page):
+        self.contacts_model.set_page_source(fetch_page)
+
+    def append_rows(self, rows):
+        self.contacts_model.append_rows(rows)
+
+    def clear(self):
+        self.contacts_model.reset()
+
+    def entry(self, row):
+        return self.contacts_model.entry(row)
+
+    def selected_entries(self):
+        return [self.entry(index.row()) for index in sorted(self.selectionModel().selectedRows(), key=QModelIndex.row)]
+
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Connections")
         self.setGeometry(100, 100, 800, 600)
-        self.conn = db_ops.connect_to_database()
+        self.conn = db_ops.get_connection()
         db_ops.create_tables_metadata_table(self.conn)
+        db_ops.collect_photo_garbage(self.conn)
         self.setWindowIcon(QIcon(resource_path('global-network.ico')))  # Set the window icon
 
         self.initUI()
@@ -88,6 +550,10 @@ class MainWindow(QMainWindow):
         self.search_tables_button.clicked.connect(self.open_search_tables_dialog)
         self.layout.addWidget(self.search_tables_button)
 
+        self.duplicates_button = QPushButton("Find Duplicates")
+        self.duplicates_button.clicked.connect(self.open_duplicates_dialog)
+        self.layout.addWidget(self.duplicates_button)
+
 
     def open_combine_tables_dialog(self):
         dialog = CombineTablesDialog(self.conn, self)
@@ -97,6 +563,11 @@ class MainWindow(QMainWindow):
         dialog = SearchTablesDialog(self.conn, self)
         dialog.exec_()
 
+    def open_duplicates_dialog(self):
+        dialog = DuplicatesDialog(self.conn, self)
+        dialog.exec_()
+        self.load_tables()
+
 
 
     def create_table_section(self):
@@ -125,44 +596,71 @@ class MainWindow(QMainWindow):
         scroll_area.setWidgetResizable(True)
         self.layout.addWidget(scroll_area)
 
+        self.table_entries = {}
         self.load_tables()
 
     def load_tables(self):
-        # Clear the grid layout
-        for i in reversed(range(self.tables_grid.count())):
-            widget = self.tables_grid.itemAt(i).widget()
-            if widget is not None:
+        # Statistics come from one cached query; only the entries of tables
+        # that were added, removed or changed are touched
+        tables = db_ops.fetch_table_stats(self.conn)
+        names = {table.name for table in tables}
+
+        for table_name in list(self.table_entries):
+            if table_name not in names:
+                widget = self.table_entries.pop(table_name)["widget"]
+                self.tables_grid.removeWidget(widget)
                 widget.deleteLater()
 
-        tables = db_ops.fetch_all_tables(self.conn)
-
         for index, table in enumerate(tables):
+            entry = self.table_entries.get(table.name)
+            if entry is None:
+                entry = self.create_table_entry(table.name)
+                self.table_entries[table.name] = entry
+            if entry["stats"] != table:
+                self.update_table_entry(entry, table)
+
             row = index // 2  # Determine the row
             col = index % 2   # Determine the column (0 or 1)
+            position = self.tables_grid.indexOf(entry["widget"])
+            if position < 0 or self.tables_grid.getItemPosition(position)[:2] != (row, col):
+                self.tables_grid.addWidget(entry["widget"], row, col)
+
+    def create_table_entry(self, table_name):
+        # Create a container widget for each table entry
+        table_entry_widget = QWidget()
+        table_entry_layout = QVBoxLayout(table_entry_widget)
+
+        table_name_label = QLabel(f"Table: {table_name}")
+        creation_date_label = QLabel()
+        contents_label = QLabel()
+        modified_label = QLabel()
+
+        view_button = QPushButton("View")
+        view_button.clicked.connect(lambda _, t=table_name: self.view_table(t))
+
+        delete_button = QPushButton("Delete")
+        delete_button.clicked.connect(lambda _, t=table_name: self.delete_table(t))
+
+        table_entry_layout.addWidget(table_name_label)
+        table_entry_layout.addWidget(creation_date_label)
+        table_entry_layout.addWidget(contents_label)
+        table_entry_layout.addWidget(modified_label)
+        table_entry_layout.addWidget(view_button)
+        table_entry_layout.addWidget(delete_button)
+
+        return {
+            "widget": table_entry_widget,
+            "created": creation_date_label,
+            "contents": contents_label,
+            "modified": modified_label,
+            "stats": None,
+        }
 
-            table_name = table[1]
-            creation_date = db_ops.get_table_creation_date(self.conn, table_name)
-
-            # Create a container widget for each table entry
-            table_entry_widget = QWidget()
-            table_entry_layout = QVBoxLayout(table_entry_widget)
-
-            table_name_label = QLabel(f"Table: {table_name}")
-            creation_date_label = QLabel(f"Created: {creation_date if creation_date else 'Unknown'}")
-
-            view_button = QPushButton("View")
-            view_button.clicked.connect(lambda _, t=table_name: self.view_table(t))
-
-            delete_button = QPushButton("Delete")
-            delete_button.clicked.connect(lambda _, t=table_name: self.delete_table(t))
-
-            table_entry_layout.addWidget(table_name_label)
-            table_entry_layout.addWidget(creation_date_label)
-            table_entry_layout.addWidget(view_button)
-            table_entry_layout.addWidget(delete_button)
-
-            # Add the table entry widget to the grid layout
-            self.tables_grid.addWidget(table_entry_widget, row, col)
+    def update_table_entry(self, entry, table):
+        entry["created"].setText(f"Created: {table.created_at if table.created_at else 'Unknown'}")
+        entry["contents"].setText(f"Contacts: {table.contacts}  Photos: {table.photos}")
+        entry["modified"].setText(f"Last modified: {table.last_modified if table.last_modified else 'Never'}")
+        entry["stats"] = table
 
     def delete_table(self, table_name):
         reply = QMessageBox.question(
@@ -194,6 +692,7 @@ class MainWindow(QMainWindow):
     def view_table(self, table_name):
         dialog = TableDialog(self.conn, table_name, self)
         dialog.exec_()
+        self.load_tables()
 
 class TableDialog(QDialog):
     def __init__(self, conn, table_name, parent=None):
@@ -212,20 +711,30 @@ class TableDialog(QDialog):
         self.entry_count_label = QLabel()
         layout.addWidget(self.entry_count_label)
 
-        self.entries_table = QTableWidget()
-        self.entries_table.setColumnCount(13)
-        self.entries_table.setHorizontalHeaderLabels(["Photo", "Name", "Phone", "Email", "WhatsApp", "Signal", "Telegram", "Facebook", "LinkedIn", "Relationship", "Notes", "Edit", "Delete"])
-        self.entries_table.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
-
-        for i in range(self.entries_table.columnCount()):
-            self.entries_table.horizontalHeader().setSectionResizeMode(i, QHeaderView.Stretch)
-        self.entries_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Fixed)
-        self.entries_table.setColumnWidth(0, PHOTO_SIZE)
-
-        self.entries_table.setWordWrap(True)
-        self.entries_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.entries_table = ContactsView(CONTACT_VIEW_COLUMNS, ["Edit", "Delete"])
+        self.entries_table.action_delegate("Edit").clicked.connect(lambda row: self.edit_entry(self.entries_table.entry(row)))
+        self.entries_table.action_delegate("Delete").clicked.connect(lambda row: self.delete_entry(self.entries_table.entry(row)))
+        self.entries_table.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.entries_table.selectionModel().selectionChanged.connect(self.update_selection_buttons)
         layout.addWidget(self.entries_table)
 
+        # Actions on every selected contact at once
+        selection_layout = QHBoxLayout()
+        self.selection_buttons = []
+        for label, action in (
+            ("Delete Selected", self.delete_selected),
+            ("Set Relationship", self.set_selected_relationship),
+            ("Set Notes", self.set_selected_notes),
+            ("Move to Table", lambda: self.transfer_selected(move=True)),
+            ("Copy to Table", lambda: self.transfer_selected(move=False)),
+        ):
+            button = QPushButton(label)
+            button.clicked.connect(action)
+            selection_layout.addWidget(button)
+            self.selection_buttons.append(button)
+        layout.addLayout(selection_layout)
+        self.update_selection_buttons()
+
         self.load_entries()
 
         self.add_entry_button = QPushButton("Add Entry")
@@ -236,44 +745,32 @@ class TableDialog(QDialog):
         self.import_google_button.clicked.connect(self.import_google_contacts)
         layout.addWidget(self.import_google_button)
 
+        vcard_layout = QHBoxLayout()
+        self.import_vcard_button = QPushButton("Import vCard")
+        self.import_vcard_button.clicked.connect(self.import_vcards)
+        vcard_layout.addWidget(self.import_vcard_button)
+
+        self.export_vcard_button = QPushButton("Export vCard")
+        self.export_vcard_button.clicked.connect(self.export_vcards)
+        vcard_layout.addWidget(self.export_vcard_button)
+        layout.addLayout(vcard_layout)
+
         self.setLayout(layout)
 
     def load_entries(self):
-        self.entries_table.setRowCount(0)
-        entries = db_ops.fetch_entries(self.conn, self.table_name)
-        
+        table_name = self.table_name
         # Update entry count label
-        self.entry_count_label.setText(f"Entry Count: {len(entries)}")
-        
-        for entry in entries:
-            row_position = self.entries_table.rowCount()
-            self.entries_table.insertRow(row_position)
-            self.entries_table.setRowHeight(row_position, PHOTO_SIZE)
-            self.entries_table.setCellWidget(row_position, 0, build_photo_label(entry[9]))
-            values = [
-                entry[1],
-                entry[2],
-                entry[3],
-                entry[4],
-                entry[5],
-                entry[6],
-                entry[7],
-                entry[8],
-                entry[10],
-                entry[11],
-            ]
-            for i, value in enumerate(values, start=1):
-                item = QTableWidgetItem(str(value))
-                item.setFlags(item.flags() & ~Qt.ItemIsEditable)
-                self.entries_table.setItem(row_position, i, item)
-
-            edit_button = QPushButton("Edit")
-            edit_button.clicked.connect(lambda _, e=entry: self.edit_entry(e))
-            self.entries_table.setCellWidget(row_position, 11, edit_button)
-
-            delete_button = QPushButton("Delete")
-            delete_button.clicked.connect(lambda _, e=entry: self.delete_entry(e))
-            self.entries_table.setCellWidget(row_position, 12, delete_button)
+        self.count_worker = start_worker(
+            lambda conn, worker: db_ops.count_entries(conn, table_name),
+            on_finished=lambda count: self.entry_count_label.setText(f"Entry Count: {count}"),
+        )
+        self.entries_table.set_page_source(
+            lambda conn, after_key, limit: db_ops.fetch_entries_page(conn, table_name, after_key, limit)
+        )
+
+    def done(self, result):
+        self.entries_table.clear()
+        super().done(result)
 
     def delete_entry(self, entry):
         reply = QMessageBox.question(
@@ -291,6 +788,80 @@ class TableDialog(QDialog):
             else:
                 QMessageBox.warning(self, "Error", f"Failed to delete entry '{entry[1]}'.")
 
+    def update_selection_buttons(self):
+        selected = self.entries_table.selectionModel().hasSelection()
+        for button in self.selection_buttons:
+            button.setEnabled(selected)
+
+    def selected_ids(self):
+        return [entry[0] for entry in self.entries_table.selected_entries()]
+
+    # Reports the outcome of a bulk operation, which returns the number of
+    # entries it changed or None
+    def bulk_finished(self, count, message, error):
+        if count is None:
+            QMessageBox.warning(self, "Error", error)
+        else:
+            QMessageBox.information(self, "Success", message.format(count=count))
+        self.load_entries()
+
+    def delete_selected(self):
+        entry_ids = self.selected_ids()
+        reply = QMessageBox.question(
+            self,
+            'Delete Entries',
+            f"Are you sure you want to delete the {len(entry_ids)} selected entries?",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No
+        )
+        if reply == QMessageBox.Yes:
+            self.bulk_finished(
+                db_ops.delete_entries(self.conn, self.table_name, entry_ids),
+                "{count} entries deleted.", "Failed to delete the selected entries.",
+            )
+
+    def set_selected_relationship(self):
+        entry_ids = self.selected_ids()
+        relationship, ok = QInputDialog.getText(self, "Set Relationship", f"Relationship for {len(entry_ids)} entries:")
+        if ok:
+            self.bulk_finished(
+                db_ops.update_entries(self.conn, self.table_name, entry_ids, {"relationship": relationship}),
+                "{count} entries updated.", "Failed to update the selected entries.",
+            )
+
+    def set_selected_notes(self):
+        entry_ids = self.selected_ids()
+        notes, ok = QInputDialog.getMultiLineText(self, "Set Notes", f"Notes for {len(entry_ids)} entries:")
+        if ok:
+            self.bulk_finished(
+                db_ops.update_entries(self.conn, self.table_name, entry_ids, {"other_notes": notes}),
+                "{count} entries updated.", "Failed to update the selected entries.",
+            )
+
+    def transfer_selected(self, move):
+        entry_ids = self.selected_ids()
+        table_names = [table[1] for table in db_ops.fetch_all_tables(self.conn)]
+        if move:
+            table_names.remove(self.table_name)
+        if not table_names:
+            QMessageBox.information(self, "Move Entries", "There is no other table to move entries to.")
+            return
+        verb = "Move" if move else "Copy"
+        target_table, ok = QInputDialog.getItem(
+            self, f"{verb} Entries", f"{verb} {len(entry_ids)} entries to table:", table_names, 0, False
+        )
+        if not ok:
+            return
+        if move:
+            count = db_ops.move_entries(self.conn, self.table_name, entry_ids, target_table)
+        else:
+            count = db_ops.copy_entries(self.conn, self.table_name, entry_ids, target_table)
+        self.bulk_finished(
+            count,
+            f"{{count}} entries {'moved' if move else 'copied'} to \"{target_table}\".",
+            f"Failed to {verb.lower()} the selected entries.",
+        )
+
     def add_entry(self):
         dialog = EntryDialog(self.conn, self.table_name, self)
         dialog.exec_()
@@ -331,7 +902,78 @@ class TableDialog(QDialog):
             return
 
         mapping = dialog.get_mapping()
-        imported, skipped, error = db_ops.import_google_contacts(self.conn, self.table_name, file_path, mapping)
+        table_name = self.table_name
+        self.start_import(
+            "Import Google Contacts",
+            lambda conn, report: db_ops.import_google_contacts(conn, table_name, file_path, mapping, progress=report),
+        )
+
+    def import_vcards(self):
+        file_path, _ = QFileDialog.getOpenFileName(
+            self,
+            "Import vCard",
+            "",
+            "vCard Files (*.vcf *.vcard);;All Files (*)",
+        )
+        if not file_path:
+            return
+
+        table_name = self.table_name
+        self.start_import(
+            "Import vCard",
+            lambda conn, report: db_ops.import_vcards(conn, table_name, file_path, progress=report),
+        )
+
+    # Run import_job(conn, report) on a worker behind a cancellable progress dialog
+    def start_import(self, title, import_job):
+        def run_import(conn, worker):
+            def report(counts):
+                worker.signals.progress.emit(counts)
+                return not worker.cancelled
+
+            return import_job(conn, report)
+
+        self.import_counts = None
+        self.import_progress = QProgressDialog("Importing contacts...", "Cancel", 0, 0, self)
+        self.import_progress.setWindowTitle(title)
+        self.import_progress.setWindowModality(Qt.WindowModal)
+        self.import_progress.setMinimumDuration(0)
+        self.import_worker = start_worker(
+            run_import,
+            on_finished=self.import_finished,
+            on_progress=self.import_progressed,
+            on_failed=self.import_failed,
+            interrupt=False,
+            read_only=False,
+        )
+        self.import_progress.canceled.connect(self.import_worker.cancel)
+        self.import_progress.show()
+
+    def import_progressed(self, counts):
+        self.import_counts = counts
+        if counts["photos_total"]:
+            self.import_progress.setLabelText(
+                f"Imported {counts['imported']} contacts. "
+                f"Downloading photos ({counts['photos_done']} of {counts['photos_total']})..."
+            )
+            self.import_progress.setRange(0, counts["photos_total"])
+            self.import_progress.setValue(counts["photos_done"])
+        else:
+            self.import_progress.setLabelText(
+                f"Read {counts['read']} rows, imported {counts['imported']} contacts..."
+            )
+
+    def import_failed(self, error):
+        self.import_progress.reset()
+        QMessageBox.warning(self, "Import Error", error)
+        self.load_entries()
+
+    def import_finished(self, result):
+        self.import_progress.reset()
+        imported, skipped, error = result
+        if self.import_worker.cancelled:
+            self.load_entries()
+            return
         if error:
             QMessageBox.warning(self, "Import Error", error)
             return
@@ -341,11 +983,45 @@ class TableDialog(QDialog):
             return
 
         message = f"Imported {imported} contacts."
+        unchanged = self.import_counts["unchanged"] if self.import_counts else 0
+        if unchanged:
+            message += f" {unchanged} contacts were already up to date."
         if skipped:
             message += f" Skipped {skipped} empty rows."
         QMessageBox.information(self, "Import Complete", message)
         self.load_entries()
 
+    def export_vcards(self):
+        file_path, selected_filter = QFileDialog.getSaveFileName(
+            self,
+            "Export vCard",
+            f"{self.table_name}.vcf",
+            "vCard 3.0 (*.vcf);;vCard 4.0 (*.vcf)",
+        )
+        if not file_path:
+            return
+        version = "4.0" if "4.0" in selected_filter else "3.0"
+
+        table_name = self.table_name
+        self.export_vcard_button.setEnabled(False)
+        self.export_worker = start_worker(
+            lambda conn, worker: db_ops.export_vcards(conn, table_name, file_path, version),
+            on_finished=self.export_finished,
+            on_failed=self.export_failed,
+        )
+
+    def export_finished(self, result):
+        self.export_vcard_button.setEnabled(True)
+        exported, error = result
+        if error:
+            QMessageBox.warning(self, "Export Error", error)
+        else:
+            QMessageBox.information(self, "Export Complete", f"Exported {exported} contacts.")
+
+    def export_failed(self, error):
+        self.export_vcard_button.setEnabled(True)
+        QMessageBox.warning(self, "Export Error", error)
+
 
 class ImportMappingDialog(QDialog):
     def __init__(self, headers, parent=None):
@@ -373,35 +1049,17 @@ class ImportMappingDialog(QDialog):
             ("photo", "Photo"),
             ("relationship", "Relationship"),
             ("other_notes", "Notes"),
+            ("import_key", "Unique ID"),
         ]
 
-        defaults = {
-            "name": ["Given Name", "First Name", "Name"],
-            "name_2": ["Family Name", "Last Name"],
-            "phone_contact": ["Phone 1 - Value", "Phone"],
-            "email": ["E-mail 1 - Value", "Email", "E-mail"],
-            "relationship": ["Group Membership", "Relationship"],
-            "other_notes": ["Notes"],
-            "whatsapp_phone": ["WhatsApp"],
-            "signal_phone": ["Signal"],
-            "telegram_handle": ["Telegram"],
-            "facebook": ["Facebook"],
-            "linkedin": ["LinkedIn"],
-            "photo": ["Photo", "Photo URL", "Photo 1 - Value"],
-        }
-
-        header_lc = {header.lower(): header for header in self.headers}
+        defaults = db_ops.suggest_csv_mapping(self.headers)
 
         for key, label in fields:
             combo = QComboBox()
             combo.addItem("")
             combo.addItems(self.headers)
-
-            for preferred in defaults.get(key, []):
-                selected = header_lc.get(preferred.lower())
-                if selected:
-                    combo.setCurrentText(selected)
-                    break
+            if defaults.get(key):
+                combo.setCurrentText(defaults[key])
 
             self.combos[key] = combo
             form_layout.addRow(f"{label}:", combo)
@@ -513,6 +1171,7 @@ class CombineTablesDialog(QDialog):
     def __init__(self, conn, parent=None):
         super().__init__(parent)
         self.conn = conn
+        self.worker = None
         self.setWindowTitle("Combine Tables")
         self.setGeometry(200, 200, 1000, 600)
         self.initUI()
@@ -544,23 +1203,14 @@ class CombineTablesDialog(QDialog):
         self.unselect_all_button.clicked.connect(self.unselect_all)
         self.layout.addWidget(self.unselect_all_button)
 
+        self.dedupe_checkbox = QCheckBox("Show contacts found in several tables once")
+        self.layout.addWidget(self.dedupe_checkbox)
+
         self.combine_button = QPushButton("Combine")
         self.combine_button.clicked.connect(self.combine_tables)
         self.layout.addWidget(self.combine_button)
 
-        self.results_table = QTableWidget()
-        self.results_table.setColumnCount(13)  # Adjusted for new columns
-        self.results_table.setHorizontalHeaderLabels(["Photo", "Name", "Phone", "Email", "WhatsApp", "Signal", "Telegram", "Facebook", "LinkedIn", "Relationship", "Notes", "Last Modified", "Source Table"])
-        self.results_table.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
-
-        # Set resize mode for each column to stretch
-        for i in range(self.results_table.columnCount()):
-            self.results_table.horizontalHeader().setSectionResizeMode(i, QHeaderView.Stretch)
-        self.results_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Fixed)
-        self.results_table.setColumnWidth(0, PHOTO_SIZE)
-
-        self.results_table.setWordWrap(True)
-        self.results_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.results_table = ContactsView(RESULT_VIEW_COLUMNS)
         self.results_table.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
         self.results_table.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
         self.layout.addWidget(self.results_table)
@@ -594,45 +1244,45 @@ class CombineTablesDialog(QDialog):
                 table_name = self.tables_list.item(row, 1).text()
                 selected_tables.append(table_name)
 
-        combined_data = db_ops.combine_tables(self.conn, selected_tables)
-        self.display_combined_data(combined_data)
+        dedupe = self.dedupe_checkbox.isChecked()
+
+        if self.worker is not None:
+            self.worker.cancel()
+        self.results_table.clear()
+        self.row_count_label.setText("Number of Entries returned: 0")
+        self.worker = start_worker(
+            lambda conn, worker: worker.emit_rows(
+                db_ops.iter_combined_tables(conn, selected_tables, dedupe=dedupe)
+            ),
+            on_rows=self.display_combined_data,
+            on_failed=self.combine_failed,
+        )
+
+    def display_combined_data(self, combined_data):
+        # Rows already queued by a combine that has since been replaced
+        if self.worker is None or self.sender() is not self.worker.signals:
+            return
+        self.results_table.append_rows(combined_data)
 
         # Update the row count label
-        row_count = len(combined_data)
+        row_count = self.results_table.model().rowCount()
         self.row_count_label.setText(f"Number of Entries returned: {row_count}")
 
-    def display_combined_data(self, combined_data):
-        self.results_table.setRowCount(0)
-
-        for entry in combined_data:
-            row_position = self.results_table.rowCount()
-            self.results_table.insertRow(row_position)
-            self.results_table.setRowHeight(row_position, PHOTO_SIZE)
-
-            self.results_table.setCellWidget(row_position, 0, build_photo_label(entry[9]))
-            values = [
-                entry[1],
-                entry[2],
-                entry[3],
-                entry[4],
-                entry[5],
-                entry[6],
-                entry[7],
-                entry[8],
-                entry[10],
-                entry[11],
-                entry[13],
-                entry[14],
-            ]
-            for i, value in enumerate(values, start=1):
-                item = QTableWidgetItem(str(value))
-                item.setFlags(item.flags() & ~Qt.ItemIsEditable)  # Make item non-editable
-                self.results_table.setItem(row_position, i, item)
+    def combine_failed(self, error):
+        if self.worker is None or self.sender() is not self.worker.signals:
+            return
+        QMessageBox.warning(self, "Combine Error", error)
+
+    def done(self, result):
+        if self.worker is not None:
+            self.worker.cancel()
+        super().done(result)
 
 class SearchTablesDialog(QDialog):
     def __init__(self, conn, parent=None):
         super().__init__(parent)
         self.conn = conn
+        self.worker = None
         self.setWindowTitle("Search Tables")
         self.setGeometry(200, 200, 1000, 600)
         self.initUI()
@@ -643,13 +1293,23 @@ class SearchTablesDialog(QDialog):
         self.row_count_label = QLabel("Number of Entries returned: 0")
         self.layout.addWidget(self.row_count_label)
 
+        # Search as you type: a search starts once typing pauses, and
+        # cancels the one still running
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(self.search_tables)
+
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("Enter search term")
+        self.search_input.textChanged.connect(self.schedule_search)
+        self.search_input.returnPressed.connect(self.search_tables)
         self.layout.addWidget(self.search_input)
 
         # Add a combo box for selecting search type
         self.search_type_combo = QComboBox()
-        self.search_type_combo.addItems(["Name", "Relationship"])
+        self.search_type_combo.addItems(["Name", "Relationship", "All Fields", "Fuzzy Name"])
+        self.search_type_combo.currentIndexChanged.connect(self.schedule_search)
         self.layout.addWidget(self.search_type_combo)
 
         self.tables_list = QTableWidget()
@@ -677,19 +1337,7 @@ class SearchTablesDialog(QDialog):
         self.search_button.clicked.connect(self.search_tables)
         self.layout.addWidget(self.search_button)
 
-        self.results_table = QTableWidget()
-        self.results_table.setColumnCount(13)  # Adjusted for new columns
-        self.results_table.setHorizontalHeaderLabels(["Photo", "Name", "Phone", "Email", "WhatsApp", "Signal", "Telegram", "Facebook", "LinkedIn", "Relationship", "Notes", "Last Modified", "Source Table"])
-        self.results_table.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
-
-        # Set resize mode for each column to stretch
-        for i in range(self.results_table.columnCount()):
-            self.results_table.horizontalHeader().setSectionResizeMode(i, QHeaderView.Stretch)
-        self.results_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Fixed)
-        self.results_table.setColumnWidth(0, PHOTO_SIZE)
-
-        self.results_table.setWordWrap(True)
-        self.results_table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.results_table = ContactsView(RESULT_VIEW_COLUMNS)
         self.results_table.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
         self.results_table.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
         self.layout.addWidget(self.results_table)
@@ -702,6 +1350,7 @@ class SearchTablesDialog(QDialog):
             self.tables_list.insertRow(row_position)
 
             checkbox = QCheckBox()
+            checkbox.stateChanged.connect(self.schedule_search)
             self.tables_list.setCellWidget(row_position, 0, checkbox)
             self.tables_list.setItem(row_position, 1, QTableWidgetItem(table[1]))
 
@@ -715,7 +1364,22 @@ class SearchTablesDialog(QDialog):
             checkbox = self.tables_list.cellWidget(row, 0)
             checkbox.setChecked(False)
 
+    def schedule_search(self):
+        if self.search_input.text().strip():
+            self.search_timer.start()
+        else:
+            self.search_timer.stop()
+            self.cancel_search()
+            self.results_table.clear()
+            self.row_count_label.setText("Number of Entries returned: 0")
+
+    def cancel_search(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+
     def search_tables(self):
+        self.search_timer.stop()
         search_term = self.search_input.text().strip()
         selected_tables = []
         for row in range(self.tables_list.rowCount()):
@@ -725,46 +1389,164 @@ class SearchTablesDialog(QDialog):
                 selected_tables.append(table_name)
 
         # Get the selected search type
-        search_type = 'name' if self.search_type_combo.currentText() == "Name" else 'relationship'
+        search_types = {"Name": 'name', "Relationship": 'relationship', "All Fields": 'all', "Fuzzy Name": 'fuzzy'}
+        search_type = search_types[self.search_type_combo.currentText()]
+
+        self.cancel_search()
+        if not selected_tables:
+            self.results_table.clear()
+            self.row_count_label.setText("Number of Entries returned: 0")
+            return
+
+        # Recent results, or a narrower term's share of them, need no query
+        cached_results = db_ops.cached_search(search_term, selected_tables, search_type)
+        if cached_results is not None:
+            self.results_table.set_rows(cached_results)
+            self.row_count_label.setText(f"Number of Entries returned: {len(cached_results)}")
+            return
+
+        self.results_table.clear()
+        self.row_count_label.setText("Number of Entries returned: 0")
+        self.worker = start_worker(
+            lambda conn, worker: worker.emit_rows(
+                db_ops.iter_cached_search(conn, search_term, selected_tables, search_type)
+            ),
+            on_rows=self.display_search_results,
+            on_failed=lambda error: QMessageBox.warning(self, "Search Error", error),
+        )
 
-        search_results = db_ops.search_tables(self.conn, search_term, selected_tables, search_type)
-        self.display_search_results(search_results)
+    def display_search_results(self, search_results):
+        # Rows already queued by a search that has since been replaced
+        if self.worker is None or self.sender() is not self.worker.signals:
+            return
+        self.results_table.append_rows(search_results)
 
         # Update the row count label
-        row_count = len(search_results)
+        row_count = self.results_table.model().rowCount()
         self.row_count_label.setText(f"Number of Entries returned: {row_count}")
 
-    def display_search_results(self, search_results):
-        self.results_table.setRowCount(0)
-
-        for entry in search_results:
-            row_position = self.results_table.rowCount()
-            self.results_table.insertRow(row_position)
-            self.results_table.setRowHeight(row_position, PHOTO_SIZE)
-
-            self.results_table.setCellWidget(row_position, 0, build_photo_label(entry[9]))
-            values = [
-                entry[1],
-                entry[2],
-                entry[3],
-                entry[4],
-                entry[5],
-                entry[6],
-                entry[7],
-                entry[8],
-                entry[10],
-                entry[11],
-                entry[13],
-                entry[14],
-            ]
-            for i, value in enumerate(values, start=1):
-                item = QTableWidgetItem(str(value))
-                item.setFlags(item.flags() & ~Qt.ItemIsEditable)  # Make item non-editable
-                self.results_table.setItem(row_position, i, item)
+    def done(self, result):
+        self.search_timer.stop()
+        self.cancel_search()
+        super().done(result)
+
+
+class DuplicatesDialog(QDialog):
+    def __init__(self, conn, parent=None):
+        super().__init__(parent)
+        self.conn = conn
+        self.worker = None
+        self.clusters = []
+        self.setWindowTitle("Find Duplicates")
+        self.setGeometry(200, 200, 1000, 600)
+        self.initUI()
+
+    def initUI(self):
+        self.layout = QVBoxLayout(self)
+
+        self.status_label = QLabel("Look for contacts that are probably the same person.")
+        self.layout.addWidget(self.status_label)
+
+        controls_layout = QHBoxLayout()
+        self.scope_combo = QComboBox()
+        self.scope_combo.addItems(["New or Edited Contacts", "All Contacts"])
+        controls_layout.addWidget(self.scope_combo)
+
+        self.find_button = QPushButton("Find Duplicates")
+        self.find_button.clicked.connect(self.find_duplicates)
+        controls_layout.addWidget(self.find_button)
+        self.layout.addLayout(controls_layout)
+
+        self.clusters_list = QListWidget()
+        self.clusters_list.currentRowChanged.connect(self.show_cluster)
+        self.layout.addWidget(self.clusters_list)
+
+        self.layout.addWidget(QLabel("Pick the contact to keep; the others are merged into it."))
+        self.cluster_table = ContactsView(RESULT_VIEW_COLUMNS, ["Keep"])
+        self.cluster_table.action_delegate("Keep").clicked.connect(self.merge_cluster)
+        self.layout.addWidget(self.cluster_table)
+
+    def find_duplicates(self):
+        new_only = self.scope_combo.currentIndex() == 0
+
+        if self.worker is not None:
+            self.worker.cancel()
+        self.clusters = []
+        self.clusters_list.clear()
+        self.cluster_table.clear()
+        self.find_button.setEnabled(False)
+        self.status_label.setText("Looking for duplicates...")
+        # Computing blocking keys writes to the database
+        self.worker = start_worker(
+            lambda conn, worker: db_ops.find_new_duplicates(conn) if new_only else db_ops.find_duplicates(conn),
+            on_finished=self.display_clusters,
+            on_failed=self.find_failed,
+            read_only=False,
+        )
+
+    def display_clusters(self, clusters):
+        # Results of a search that has since been replaced
+        if self.worker is None or self.sender() is not self.worker.signals:
+            return
+        self.find_button.setEnabled(True)
+        self.clusters = clusters or []
+        self.status_label.setText(f"Groups of duplicates found: {len(self.clusters)}")
+        for cluster in self.clusters:
+            tables = ", ".join(dict.fromkeys(row[-1] for row in cluster))
+            self.clusters_list.addItem(f"{cluster[0][1]} ({len(cluster)} contacts in {tables})")
+
+    def find_failed(self, error):
+        if self.worker is None or self.sender() is not self.worker.signals:
+            return
+        self.find_button.setEnabled(True)
+        self.status_label.setText("Finding duplicates failed.")
+        QMessageBox.warning(self, "Duplicates Error", error)
+
+    def show_cluster(self, index):
+        if 0 <= index < len(self.clusters):
+            self.cluster_table.set_rows(iter(self.clusters[index]))
+        else:
+            self.cluster_table.clear()
+
+    def merge_cluster(self, row):
+        index = self.clusters_list.currentRow()
+        if not 0 <= index < len(self.clusters):
+            return
+        keep = self.cluster_table.entry(row)
+        others = [entry[0] for entry in self.clusters[index] if entry[0] != keep[0]]
+
+        reply = QMessageBox.question(
+            self,
+            'Merge Contacts',
+            f"Merge {len(others)} other contacts into '{keep[1]}' from table '{keep[-1]}'?",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
+
+        if db_ops.merge_contacts(self.conn, keep[0], others):
+            del self.clusters[index]
+            self.clusters_list.takeItem(index)
+            self.status_label.setText(f"Groups of duplicates found: {len(self.clusters)}")
+        else:
+            QMessageBox.warning(self, "Error", "Failed to merge contacts.")
+
+    def done(self, result):
+        if self.worker is not None:
+            self.worker.cancel()
+        super().done(result)
 
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="Connections contact manager")
+    parser.add_argument("--data-dir", help=f"directory holding the database (default: ${db_ops.DATA_DIR_ENV} or the user data directory)")
+    parser.add_argument("--photos-dir", help=f"directory for photos, kept in its cache/ subdirectory (default: ${db_ops.PHOTOS_DIR_ENV} or DATA_DIR/photos)")
+    args, qt_args = parser.parse_known_args()
+    if args.data_dir or args.photos_dir:
+        db_ops.open_store(args.data_dir, args.photos_dir)
+
+    app = QApplication(sys.argv[:1] + qt_args)
     main_window = MainWindow()
     main_window.show()
     sys.exit(app.exec_())
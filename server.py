@@ -0,0 +1,471 @@
+# HTTP/JSON server for sharing one contacts database between several
+# clients, using only the standard library:
+#
+#     python -m server --port 8765
+#     curl localhost:8765/tables
+#     curl 'localhost:8765/search?q=alice&table=friends&type=fuzzy'
+#
+# Requests are served on threads. Reads borrow one of a fixed pool of
+# read-only connections; writes take the single read-write connection in
+# turn, so clients share the connections' page caches and the backend's
+# caches instead of each opening the database. GET responses carry an ETag
+# and answer If-None-Match with 304, and large bodies are gzipped for
+# clients that accept it.
+import argparse
+import base64
+import binascii
+import contextlib
+import csv
+import gzip
+import hashlib
+import json
+import queue
+import re
+import sys
+import tempfile
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import backend as db_ops
+
+DEFAULT_PORT = 8765
+DEFAULT_READERS = 4
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_JSON_BYTES = 1024 * 1024
+GZIP_MIN_BYTES = 4096
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+RESULT_COLUMNS = db_ops.ENTRY_COLUMNS + ("source_table",)
+SEARCH_TYPES = ("name", "relationship", "all", "fuzzy")
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# Page keys are handed to clients as opaque tokens
+def encode_page_key(key):
+    if key is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode("utf-8")).decode("ascii")
+
+
+def decode_page_key(token):
+    if not token:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except (ValueError, binascii.Error):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "Invalid page token.")
+    if not isinstance(key, list):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "Invalid page token.")
+    return tuple(key)
+
+
+def page_payload(rows, next_key, columns):
+    return {"rows": [dict(zip(columns, row)) for row in rows], "next": encode_page_key(next_key)}
+
+
+# Contact fields from a JSON object, laid over base (an entry tuple) for
+# the fields it leaves out
+def entry_from_json(fields, base=None):
+    if not isinstance(fields, dict):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "Expected a JSON object of contact fields.")
+    unknown = set(fields) - set(db_ops.CONTACT_FIELDS)
+    if unknown:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"Unknown fields: {', '.join(sorted(unknown))}.")
+    if any(value is not None and not isinstance(value, str) for value in fields.values()):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "Contact fields must be strings.")
+    base = base or ("",) * len(db_ops.CONTACT_FIELDS)
+    entry = tuple(
+        fields[field] or "" if field in fields else value
+        for field, value in zip(db_ops.CONTACT_FIELDS, base)
+    )
+    if not entry[0].strip():
+        raise ApiError(HTTPStatus.BAD_REQUEST, "A contact needs a name.")
+    return entry
+
+
+class ContactServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, readers=DEFAULT_READERS, quiet=False):
+        self.quiet = quiet
+        self.readers = queue.Queue()
+        self.reader_connections = []
+        self.write_conn = None
+        self.write_lock = threading.Lock()
+        try:
+            self.write_conn = self.connect(read_only=False)
+            for _ in range(readers):
+                conn = self.connect(read_only=True)
+                self.reader_connections.append(conn)
+                self.readers.put(conn)
+        except Exception:
+            self.close_connections()
+            raise
+        super().__init__(address, RequestHandler)
+
+    @staticmethod
+    def connect(read_only):
+        conn = db_ops.connect_to_database(read_only, check_same_thread=False)
+        if conn is None or not db_ops.migrate_database(conn):
+            raise RuntimeError("Could not open the database.")
+        return conn
+
+    @contextlib.contextmanager
+    def reader(self):
+        conn = self.readers.get()
+        try:
+            yield conn
+        finally:
+            self.readers.put(conn)
+
+    @contextlib.contextmanager
+    def writer(self):
+        with self.write_lock:
+            yield self.write_conn
+
+    def close_connections(self):
+        for conn in self.reader_connections + [self.write_conn]:
+            if conn is not None:
+                conn.close()
+        self.reader_connections = []
+        self.write_conn = None
+
+    def server_close(self):
+        super().server_close()
+        self.close_connections()
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "Connections"
+
+    # (method, path pattern, handler); path groups are passed to the handler
+    ROUTES = [
+        ("GET", r"/tables", "list_tables"),
+        ("POST", r"/tables", "create_table"),
+        ("DELETE", r"/tables/([^/]+)", "delete_table"),
+        ("GET", r"/tables/([^/]+)/entries", "list_entries"),
+        ("POST", r"/tables/([^/]+)/entries", "add_entry"),
+        ("GET", r"/tables/([^/]+)/entries/(\d+)", "get_entry"),
+        ("PUT", r"/tables/([^/]+)/entries/(\d+)", "update_entry"),
+        ("DELETE", r"/tables/([^/]+)/entries/(\d+)", "delete_entry"),
+        ("POST", r"/tables/([^/]+)/import", "import_csv"),
+        ("GET", r"/search", "search"),
+        ("GET", r"/combine", "combine"),
+    ]
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_PUT(self):
+        self.dispatch("PUT")
+
+    def do_DELETE(self):
+        self.dispatch("DELETE")
+
+    def dispatch(self, method):
+        self.body_read = False
+        url = urlsplit(self.path)
+        self.query = parse_qs(url.query, keep_blank_values=True)
+        try:
+            allowed = []
+            for route_method, pattern, handler in self.ROUTES:
+                match = re.fullmatch(pattern, url.path.rstrip("/") or "/")
+                if match is None:
+                    continue
+                if route_method != method:
+                    allowed.append(route_method)
+                    continue
+                status, payload = getattr(self, handler)(*(unquote(group) for group in match.groups()))
+                self.send_json(status, payload)
+                return
+            if allowed:
+                raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, f"Use {', '.join(allowed)} here.")
+            raise ApiError(HTTPStatus.NOT_FOUND, "No such endpoint.")
+        except ApiError as e:
+            self.send_error_json(e.status, str(e))
+        except Exception as e:
+            self.log_error("Error handling %s %s: %r", method, self.path, e)
+            self.send_error_json(HTTPStatus.INTERNAL_SERVER_ERROR, "Internal server error.")
+
+    def send_error_json(self, status, message):
+        # An unread request body would be taken for the next request
+        if not self.body_read and self.headers.get("Content-Length", "0") != "0":
+            self.close_connection = True
+        self.send_json(status, {"error": message})
+
+    # JSON response. Successful GETs get an ETag from the body, so a client
+    # sending it back in If-None-Match gets 304 and no body when nothing
+    # changed.
+    def send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        headers = {"Content-Type": "application/json; charset=utf-8"}
+        if self.command == "GET" and status == HTTPStatus.OK:
+            etag = f'W/"{hashlib.sha1(body).hexdigest()}"'
+            headers["ETag"] = etag
+            headers["Vary"] = "Accept-Encoding"
+            requested = self.headers.get("If-None-Match", "")
+            if etag in (tag.strip() for tag in requested.split(",")) or requested.strip() == "*":
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                for name, value in headers.items():
+                    if name != "Content-Type":
+                        self.send_header(name, value)
+                self.end_headers()
+                return
+        if len(body) >= GZIP_MIN_BYTES and self.accepts_gzip():
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def accepts_gzip(self):
+        for coding in self.headers.get("Accept-Encoding", "").split(","):
+            name, _, params = coding.strip().partition(";")
+            if name.strip().lower() in ("gzip", "*"):
+                return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+        return False
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def content_length(self):
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            raise ApiError(HTTPStatus.LENGTH_REQUIRED, "Content-Length is required.")
+        if length < 0:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length.")
+        return length
+
+    def read_json(self):
+        length = self.content_length()
+        if length > MAX_JSON_BYTES:
+            raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large.")
+        body = self.rfile.read(length)
+        self.body_read = True
+        try:
+            return json.loads(body or b"null")
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Request body is not valid JSON.")
+
+    def param(self, name, default=None):
+        values = self.query.get(name)
+        return values[-1] if values else default
+
+    def page_size(self):
+        try:
+            limit = int(self.param("limit", DEFAULT_PAGE_SIZE))
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "limit must be a number.")
+        return min(max(limit, 1), MAX_PAGE_SIZE)
+
+    def flag(self, name, default):
+        value = self.param(name)
+        if value is None:
+            return default
+        return value.lower() not in ("0", "false", "no", "")
+
+    @staticmethod
+    def require_table(conn, table_name):
+        if not db_ops.is_valid_table_name(table_name):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Invalid table name.")
+        if db_ops.get_table_creation_date(conn, table_name) is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f'Table "{table_name}" does not exist.')
+
+    def table_names(self, conn):
+        table_names = self.query.get("table", [])
+        for table_name in table_names:
+            self.require_table(conn, table_name)
+        return table_names
+
+    def list_tables(self):
+        with self.server.reader() as conn:
+            tables = db_ops.fetch_table_stats(conn)
+        return HTTPStatus.OK, {"tables": [table._asdict() for table in tables]}
+
+    def create_table(self):
+        body = self.read_json()
+        table_name = body.get("name") if isinstance(body, dict) else None
+        if not isinstance(table_name, str) or not db_ops.is_valid_table_name(table_name):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Invalid table name.")
+        with self.server.writer() as conn:
+            if db_ops.get_table_creation_date(conn, table_name) is not None:
+                raise ApiError(HTTPStatus.CONFLICT, f'Table "{table_name}" already exists.')
+            if not db_ops.add_table_metadata(conn, table_name):
+                raise ApiError(HTTPStatus.INTERNAL_SERVER_ERROR, f'Could not create table "{table_name}".')
+        return HTTPStatus.CREATED, {"created": table_name}
+
+    def delete_table(self, table_name):
+        with self.server.writer() as conn:
+            self.require_table(conn, table_name)
+            if not db_ops.delete_table(conn, table_name):
+                raise ApiError(HTTPStatus.INTERNAL_SERVER_ERROR, f'Could not delete table "{table_name}".')
+        return HTTPStatus.OK, {"deleted": table_name}
+
+    def list_entries(self, table_name):
+        with self.server.reader() as conn:
+            self.require_table(conn, table_name)
+            rows, next_key = db_ops.fetch_entries_page(
+                conn, table_name, decode_page_key(self.param("after")), self.page_size()
+            )
+        return HTTPStatus.OK, page_payload(rows, next_key, db_ops.ENTRY_COLUMNS)
+
+    def get_entry(self, table_name, entry_id):
+        with self.server.reader() as conn:
+            self.require_table(conn, table_name)
+            row = db_ops.fetch_entry(conn, table_name, int(entry_id))
+        if row is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No entry {entry_id} in table \"{table_name}\".")
+        return HTTPStatus.OK, dict(zip(db_ops.ENTRY_COLUMNS, row))
+
+    def add_entry(self, table_name):
+        entry = entry_from_json(self.read_json())
+        with self.server.writer() as conn:
+            self.require_table(conn, table_name)
+            if not db_ops.add_entry(conn, table_name, entry):
+                raise ApiError(HTTPStatus.INTERNAL_SERVER_ERROR, "Could not add the entry.")
+            entry_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            row = db_ops.fetch_entry(conn, table_name, entry_id)
+        return HTTPStatus.CREATED, dict(zip(db_ops.ENTRY_COLUMNS, row))
+
+    # Fields left out of the body keep their current values
+    def update_entry(self, table_name, entry_id):
+        fields = self.read_json()
+        with self.server.writer() as conn:
+            self.require_table(conn, table_name)
+            row = db_ops.fetch_entry(conn, table_name, int(entry_id))
+            if row is None:
+                raise ApiError(HTTPStatus.NOT_FOUND, f"No entry {entry_id} in table \"{table_name}\".")
+            entry = entry_from_json(fields, row[1:1 + len(db_ops.CONTACT_FIELDS)])
+            if not db_ops.edit_entry(conn, table_name, int(entry_id), entry):
+                raise ApiError(HTTPStatus.INTERNAL_SERVER_ERROR, "Could not update the entry.")
+            row = db_ops.fetch_entry(conn, table_name, int(entry_id))
+        return HTTPStatus.OK, dict(zip(db_ops.ENTRY_COLUMNS, row))
+
+    def delete_entry(self, table_name, entry_id):
+        with self.server.writer() as conn:
+            self.require_table(conn, table_name)
+            if db_ops.fetch_entry(conn, table_name, int(entry_id)) is None:
+                raise ApiError(HTTPStatus.NOT_FOUND, f"No entry {entry_id} in table \"{table_name}\".")
+            if not db_ops.delete_entry(conn, table_name, int(entry_id)):
+                raise ApiError(HTTPStatus.INTERNAL_SERVER_ERROR, "Could not delete the entry.")
+        return HTTPStatus.OK, {"deleted": int(entry_id)}
+
+    # The body is a Google Contacts CSV export. Columns are mapped as the
+    # import dialog suggests; map=FIELD=COLUMN parameters override that.
+    # update=0 adds every row instead of updating earlier imports.
+    def import_csv(self, table_name):
+        length = self.content_length()
+        with tempfile.NamedTemporaryFile(suffix=".csv") as upload:
+            remaining = length
+            while remaining:
+                chunk = self.rfile.read(min(remaining, UPLOAD_CHUNK_SIZE))
+                if not chunk:
+                    raise ApiError(HTTPStatus.BAD_REQUEST, "Request body ended early.")
+                upload.write(chunk)
+                remaining -= len(chunk)
+            upload.flush()
+            self.body_read = True
+
+            try:
+                with open(upload.name, newline="", encoding="utf-8-sig") as csv_file:
+                    headers = csv.DictReader(csv_file).fieldnames or []
+            except (UnicodeDecodeError, csv.Error) as e:
+                raise ApiError(HTTPStatus.BAD_REQUEST, f"Could not read CSV: {e}")
+            mapping = db_ops.suggest_csv_mapping(headers)
+            for item in self.query.get("map", []):
+                field, separator, column = item.partition("=")
+                if not separator or field not in mapping:
+                    raise ApiError(HTTPStatus.BAD_REQUEST, f'Invalid mapping "{item}"; use FIELD=COLUMN.')
+                mapping[field] = column
+            if not (mapping.get("name") or mapping.get("name_2")):
+                raise ApiError(HTTPStatus.BAD_REQUEST, "No name column found; map one with map=name=COLUMN.")
+
+            counts = {"unchanged": 0}
+            with self.server.writer() as conn:
+                self.require_table(conn, table_name)
+                imported, skipped, error = db_ops.import_google_contacts(
+                    conn, table_name, upload.name, mapping,
+                    progress=counts.update, update=self.flag("update", True),
+                )
+        if error:
+            raise ApiError(HTTPStatus.BAD_REQUEST, error)
+        return HTTPStatus.OK, {"imported": imported, "unchanged": counts["unchanged"], "skipped": skipped}
+
+    def search(self):
+        search_type = self.param("type", "name")
+        if search_type not in SEARCH_TYPES:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"type must be one of: {', '.join(SEARCH_TYPES)}.")
+        with self.server.reader() as conn:
+            table_names = self.table_names(conn) or [table[1] for table in db_ops.fetch_all_tables(conn)]
+            if not table_names:
+                return HTTPStatus.OK, page_payload([], None, RESULT_COLUMNS)
+            rows, next_key = db_ops.search_tables_page(
+                conn, self.param("q", ""), table_names, search_type,
+                decode_page_key(self.param("after")), self.page_size(),
+            )
+        return HTTPStatus.OK, page_payload(rows, next_key, RESULT_COLUMNS)
+
+    def combine(self):
+        with self.server.reader() as conn:
+            table_names = self.table_names(conn)
+            if len(set(table_names)) < 2:
+                raise ApiError(HTTPStatus.BAD_REQUEST, "Give at least two tables to combine.")
+            rows, next_key = db_ops.combine_tables_page(
+                conn, table_names, decode_page_key(self.param("after")), self.page_size()
+            )
+        return HTTPStatus.OK, page_payload(rows, next_key, RESULT_COLUMNS)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m server", description="Serve the Connections contacts database over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument("--readers", type=int, default=DEFAULT_READERS, help="read-only connections to keep open")
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not log requests")
+    parser.add_argument(
+        "--data-dir",
+        help=f"directory holding the database (default: ${db_ops.DATA_DIR_ENV} or the user data directory)",
+    )
+    parser.add_argument("--photos-dir", help=f"directory for photos, kept in its cache/ subdirectory (default: ${db_ops.PHOTOS_DIR_ENV} or DATA_DIR/photos)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if db_ops.open_store(args.data_dir, args.photos_dir) is None:
+        print("error: Could not open the database.", file=sys.stderr)
+        return 1
+    try:
+        server = ContactServer((args.host, args.port), max(args.readers, 1), args.quiet)
+    except (OSError, RuntimeError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    print(f"Serving contacts on http://{args.host}:{server.server_address[1]}/", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())